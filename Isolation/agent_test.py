@@ -3,13 +3,36 @@ tests to run and debug your minimax and alphabeta agents locally.  The test
 cases used by the project assistant are not public.
 """
 
+import contextlib
+import io
+import itertools
+import multiprocessing
+import os
+import pickle
+import random
+import tempfile
+import time
+import timeit
 import unittest
 
 import isolation
+import benchmark
 import game_agent
+import competition_agent
+import endgame
+import heuristic_tuning
+import opening_book
+import parallel_agent
+import sample_players
+import tournament
 
 from importlib import reload
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 class IsolationTest(unittest.TestCase):
     """Unit tests for isolation agents"""
@@ -20,6 +43,755 @@ class IsolationTest(unittest.TestCase):
         self.player2 = "Player2"
         self.game = isolation.Board(self.player1, self.player2)
 
+    def test_push_pop_restores_state(self):
+        for board_class in (isolation.Board, isolation.BitBoard,
+                            isolation.CompactBoard):
+            game = board_class(self.player1, self.player2)
+            game.apply_move((2, 3))
+            game.apply_move((0, 5))
+            before = (game.to_string(), game.hash(), game.move_count,
+                      game.active_player)
+            for move in game.get_legal_moves():
+                expected = game.forecast_move(move)
+                game.push_move(move)
+                self.assertEqual(expected.to_string(), game.to_string())
+                self.assertEqual(expected.hash(), game.hash())
+                for reply in game.get_legal_moves():
+                    game.push_move(reply)
+                    game.pop_move()
+                game.pop_move()
+                self.assertEqual(before, (game.to_string(), game.hash(),
+                                          game.move_count, game.active_player))
+
+    def test_search_leaves_board_unchanged(self):
+        player = game_agent.AlphaBetaPlayer()
+        self.game = isolation.Board(player, self.player2)
+        self.game.apply_move((3, 3))
+        self.game.apply_move((2, 2))
+        before = self.game.to_string()
+        deadline = timeit.default_timer() + 0.1
+        move = player.get_move(self.game,
+                               lambda: 1000 * (deadline - timeit.default_timer()))
+        self.assertIn(move, self.game.get_legal_moves())
+        self.assertEqual(before, self.game.to_string())
+
+    def test_shuffle_free_boards_are_reproducible(self):
+        player = game_agent.MinimaxPlayer(search_depth=2)
+        player.time_left = lambda: 1000.
+        for board_class in (isolation.Board, isolation.BitBoard,
+                            isolation.CompactBoard):
+            game = board_class(player, self.player2, shuffle=False)
+            game.apply_move((3, 3))
+            game.apply_move((2, 2))
+            moves = game.get_legal_moves()
+            self.assertEqual(moves, game.get_legal_moves())
+            self.assertEqual(moves, game.copy().get_legal_moves())
+            self.assertEqual(player.minimax(game, 2), player.minimax(game, 2))
+
+    def test_tie_break_picks_among_equal_moves(self):
+        player = game_agent.MinimaxPlayer(
+            search_depth=1, score_fn=lambda game, player: 0.,
+            tie_break=random.Random(0))
+        player.time_left = lambda: 1000.
+        self.game = isolation.Board(player, self.player2, shuffle=False)
+        self.game.apply_move((3, 3))
+        self.game.apply_move((2, 2))
+        picks = {player.minimax(self.game, 1) for _ in range(50)}
+        self.assertEqual(picks, set(self.game.get_legal_moves()))
+
+    def test_mcts_reuses_tree_between_turns(self):
+        player = competition_agent.CustomPlayer(timeout=0.)
+        opponent = game_agent.AlphaBetaPlayer()
+        game = isolation.Board(player, opponent, 5, 5)
+        game.apply_move((2, 2))
+        game.apply_move((0, 0))
+        budget = itertools.count(400, -1)
+        move = player.get_move(game, lambda: next(budget))
+        self.assertIn(move, game.get_legal_moves())
+        self.assertGreater(player.playouts, 0)
+        game.apply_move(move)
+        reply = game.get_legal_moves()[0]
+        game.apply_move(reply)
+        budget = itertools.count(10, -1)
+        player.get_move(game, lambda: next(budget))
+        self.assertGreater(player.reused_visits, 0)
+
+    def test_opening_book_answers_symmetric_positions(self):
+        book = opening_book.OpeningBook(5, 5, plies=2)
+        game = isolation.Board(self.player1, self.player2, 5, 5)
+        game.apply_move((0, 1))
+        book.add(game, (2, 3))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "book.bin")
+            book.save(path)
+            book = opening_book.OpeningBook.load(path)
+        self.assertEqual(len(book), 1)
+        for first, reply in [((0, 1), (2, 3)), ((0, 3), (2, 1)),
+                             ((1, 0), (3, 2)), ((4, 3), (2, 1))]:
+            game = isolation.Board(self.player1, self.player2, 5, 5)
+            game.apply_move(first)
+            self.assertEqual(book.lookup(game), reply)
+        game.apply_move((2, 2))
+        self.assertIsNone(book.lookup(game))
+
+    def test_endgame_solver_matches_exhaustive_search(self):
+        def active_player_wins(game):
+            return any(not active_player_wins(game.forecast_move(move))
+                       for move in game.get_legal_moves())
+
+        rng = random.Random(0)
+        solver = endgame.EndgameSolver(5, 5)
+        solved = 0
+        while solved < 20:
+            game = isolation.Board(self.player1, self.player2, 5, 5)
+            while game.get_legal_moves():
+                result = solver.solve(game)
+                if result is not None:
+                    move, own_length, opp_length = result
+                    self.assertEqual(own_length > opp_length,
+                                     active_player_wins(game))
+                    if own_length:
+                        self.assertIn(move, game.get_legal_moves())
+                    solved += 1
+                    break
+                game.apply_move(rng.choice(game.get_legal_moves()))
+
+    def test_transposition_table_preserves_search_values(self):
+        rng = random.Random(5)
+        player = game_agent.AlphaBetaPlayer()
+        player.time_left = lambda: 1000.
+        table = player.tt
+        for _ in range(10):
+            self.game = isolation.Board(player, self.player2, shuffle=False)
+            for _ in range(2 * rng.randint(1, 8)):
+                self.game.apply_move(rng.choice(self.game.get_legal_moves()))
+            if not self.game.get_legal_moves():
+                continue
+            for depth in range(1, 5):
+                player.tt = None
+                expected = player.max_play(self.game, depth)
+                player.tt = table
+                table.new_search()
+                self.assertEqual(expected, player.max_play(self.game, depth))
+        self.assertGreater(table.hits, 0)
+
+    def test_transposition_table_replacement(self):
+        table = game_agent.TranspositionTable(
+            max_bytes=4 * game_agent.TranspositionTable.ENTRY_BYTES)
+        table.store(1, 5, 1., game_agent.EXACT, (0, 0))
+        table.store(5, 3, 2., game_agent.EXACT, (1, 1))
+        self.assertEqual(table.probe(1), (5, 1., game_agent.EXACT, (0, 0)))
+        self.assertIsNone(table.probe(5))
+        table.new_search()
+        table.store(5, 3, 2., game_agent.LOWER_BOUND, (1, 1))
+        self.assertEqual(table.probe(5), (3, 2., game_agent.LOWER_BOUND, (1, 1)))
+        self.assertEqual((table.hits, table.misses), (2, 1))
+
+    def test_shared_transposition_table(self):
+        table = parallel_agent.SharedTranspositionTable(
+            max_bytes=4 * parallel_agent.SharedTranspositionTable.ENTRY_BYTES)
+        view = table.attach()
+        table.store(2**64 - 3, 7, -1.25, game_agent.LOWER_BOUND, (6, 6))
+        view.store(0, 2, float("-inf"), game_agent.EXACT, None)
+        self.assertEqual(view.probe(2**64 - 3),
+                         (7, -1.25, game_agent.LOWER_BOUND, (6, 6)))
+        self.assertEqual(table.probe(0), (2, float("-inf"), game_agent.EXACT, None))
+        self.assertIsNone(table.probe(4))
+        # moves of boards wider than 64 columns keep their coordinates
+        table.store(6, 1, 0., game_agent.EXACT, (70, 130))
+        self.assertEqual(view.probe(6)[3], (70, 130))
+        with self.assertRaises(AssertionError):
+            table.store(7, 1, 0., game_agent.EXACT, (0, 2**16))
+        view.new_search()
+        self.assertEqual(table.generation, 0)
+        table.clear()
+        self.assertEqual(len(view), 0)
+
+    def test_move_ordering_statistics(self):
+        player = game_agent.AlphaBetaPlayer()
+        self.game = isolation.Board(player, self.player2, shuffle=False)
+        self.game.apply_move((3, 3))
+        self.game.apply_move((2, 2))
+        deadline = timeit.default_timer() + 0.1
+        player.get_move(self.game,
+                        lambda: 1000 * (deadline - timeit.default_timer()))
+        self.assertGreater(len(player.depth_nodes), 1)
+        self.assertGreater(player.effective_branching_factor(), 1.)
+        self.assertTrue(player._history)
+        self.assertTrue(any(player._killers))
+
+        moves = self.game.get_legal_moves()
+        player._killers = [[moves[-1]]]
+        player._history = {moves[-2]: 10}
+        ordered = player._order_moves(list(moves), moves[-3], 0)
+        self.assertEqual(ordered[:3], [moves[-3], moves[-1], moves[-2]])
+
+    def test_clock_check_interval_is_calibrated(self):
+        player = game_agent.AlphaBetaPlayer(timeout=10.)
+        clock = [100.]
+        player._start_clock(lambda: clock[0])
+        player._check_clock()
+        self.assertEqual(player._countdown, 2)
+        clock[0] = 99.
+        player._check_clock()
+        # two nodes took 1 ms, so read the clock again after 2.5 ms
+        self.assertEqual(player._countdown, 5)
+        clock[0] = 12.
+        player._check_clock()
+        self.assertEqual(player._countdown, 1)
+        clock[0] = 9.
+        self.assertRaises(game_agent.SearchTimeout, player._check_clock)
+
+    def test_search_stats(self):
+        player = game_agent.AlphaBetaPlayer()
+        player.stats = game_agent.SearchStats()
+        self.game = isolation.Board(player, self.player2)
+        self.game.apply_move((3, 3))
+        self.game.apply_move((2, 2))
+        deadline = timeit.default_timer() + 0.05
+        score_fn = player.score
+        player.get_move(self.game,
+                        lambda: 1000 * (deadline - timeit.default_timer()))
+        self.assertIs(player.score, score_fn)
+        record, = player.stats.records
+        self.assertEqual(record.depth, len(player.depth_nodes))
+        self.assertGreaterEqual(record.nodes, sum(player.depth_nodes))
+        self.assertGreater(record.eval_calls, 0)
+        self.assertLessEqual(record.first_move_cutoffs, record.cutoffs)
+        summary = player.stats.summary()
+        self.assertEqual(summary["moves"], 1)
+        self.assertTrue(0 < summary["eval_share"] < 1)
+
+    def test_extensions_and_quiescence(self):
+        def reference(player, game, depth, plies, extensions, maximizing):
+            # plain minimax with the same extension and quiescence rules
+            moves = game.get_legal_moves()
+            if depth == 0:
+                if not plies or not moves or len(moves) > 2:
+                    return player.score(game, player)
+                plies -= 1
+            elif not moves:
+                return float("-inf") if maximizing else float("inf")
+            elif len(moves) <= 2 and extensions < player.max_extensions:
+                extensions += 1
+            else:
+                depth -= 1
+            scores = []
+            for move in moves:
+                game.push_move(move)
+                scores.append(reference(player, game, depth, plies,
+                                        extensions, not maximizing))
+                game.pop_move()
+            return max(scores) if maximizing else min(scores)
+
+        rng = random.Random(1)
+        player = game_agent.AlphaBetaPlayer(tt_bytes=0, max_extensions=2,
+                                            quiescence=3)
+        player.time_left = lambda: 1000.
+        for _ in range(15):
+            self.game = isolation.Board(player, self.player2, 5, 5,
+                                        shuffle=False)
+            for _ in range(2 * rng.randint(2, 5)):
+                self.game.apply_move(rng.choice(self.game.get_legal_moves()))
+            if not self.game.get_legal_moves():
+                continue
+            for depth in range(1, 4):
+                self.assertEqual(player.max_play(self.game, depth),
+                                 reference(player, self.game, depth, 3, 0, True))
+        self.assertEqual(player._extension_depth, 0)
+
+        player.stats = game_agent.SearchStats()
+        self.game = isolation.Board(player, self.player2, 5, 5, shuffle=False)
+        for move in [(0, 0), (4, 4), (1, 2), (2, 3)]:
+            self.game.apply_move(move)
+        deadline = timeit.default_timer() + 0.05
+        player.get_move(self.game,
+                        lambda: 1000 * (deadline - timeit.default_timer()))
+        record, = player.stats.records
+        self.assertGreater(player.extensions, 0)
+        self.assertEqual(record.extension_nodes, player.extension_nodes)
+        self.assertEqual(record.quiescence_nodes, player.quiescence_nodes)
+        summary = player.stats.summary()
+        self.assertTrue(0 < summary["extension_share"] < 1)
+
+    def test_pvs_and_aspiration_preserve_root_score(self):
+        rng = random.Random(3)
+        player = game_agent.AlphaBetaPlayer()
+        player.time_left = lambda: 1000.
+        for _ in range(10):
+            self.game = isolation.Board(player, self.player2, shuffle=False)
+            for _ in range(2 * rng.randint(1, 8)):
+                self.game.apply_move(rng.choice(self.game.get_legal_moves()))
+            if not self.game.get_legal_moves():
+                continue
+            scores = []
+            for pvs, aspiration in ((False, None), (True, None), (True, 0.5)):
+                player.pvs, player.aspiration = pvs, aspiration
+                player.tt = game_agent.TranspositionTable()
+                for depth in range(1, 5):
+                    player._search_root(self.game, depth)
+                scores.append(player.root_score)
+            self.assertEqual(len(set(scores)), 1, scores)
+
+    def test_placement_moves_cover_every_symmetric_move(self):
+        game = isolation.Board(self.player1, self.player2, 15, 15)
+        moves = game_agent.placement_moves(game)
+        self.assertEqual(len(moves), 36)
+        self.assertEqual(moves[0], (7, 7))
+        self.assertEqual(game_agent.placement_moves(game, limit=5), moves[:5])
+
+        game.apply_move((7, 7))
+        self.assertEqual(len(game_agent.placement_moves(game)), 35)
+        game = isolation.Board(self.player1, self.player2, 15, 15)
+        game.apply_move((0, 1))
+        # No symmetry of the board leaves (0, 1) in place
+        self.assertEqual(len(game_agent.placement_moves(game)), 224)
+
+        game.apply_move((7, 7))
+        self.assertEqual(sorted(game_agent.placement_moves(game)),
+                         sorted(game.get_legal_moves()))
+
+
+class BitBoardTest(unittest.TestCase):
+    """Check that BitBoard and CompactBoard follow the same rules as Board"""
+
+    def setUp(self):
+        self.player1 = "Player1"
+        self.player2 = "Player2"
+
+    def test_random_games_match_board(self):
+        rng = random.Random(0)
+        for cls, (width, height) in itertools.product(
+                (isolation.BitBoard, isolation.CompactBoard),
+                [(7, 7), (5, 8), (8, 5)]):
+            for _ in range(20):
+                game = isolation.Board(self.player1, self.player2, width, height)
+                bits = cls(self.player1, self.player2, width, height)
+                while True:
+                    moves = sorted(game.get_legal_moves())
+                    self.assertEqual(moves, sorted(bits.get_legal_moves()))
+                    for player in (self.player1, self.player2):
+                        self.assertEqual(game.get_player_location(player),
+                                         bits.get_player_location(player))
+                        self.assertEqual(game.utility(player), bits.utility(player))
+                        self.assertEqual(game.is_winner(player), bits.is_winner(player))
+                        self.assertEqual(game.is_loser(player), bits.is_loser(player))
+                        self.assertEqual(len(game.get_legal_moves(player)),
+                                         game.mobility(player))
+                        self.assertEqual(game.mobility(player), bits.mobility(player))
+                        context = game.evaluation_context(player)
+                        self.assertEqual(context, bits.evaluation_context(player))
+                        self.assertEqual(context.utility, game.utility(player))
+                        self.assertEqual(context.opp_moves, game.mobility(
+                            game.get_opponent(player)))
+                    self.assertEqual(game.to_string(), bits.to_string())
+                    self.assertEqual(game.hash(), bits.hash())
+                    if not moves:
+                        break
+                    move = rng.choice(moves)
+                    self.assertEqual(game.move_is_legal(move), bits.move_is_legal(move))
+                    game.apply_move(move)
+                    bits = bits.forecast_move(move)
+
+    def test_neighbor_tables_are_shared(self):
+        game = isolation.Board(self.player1, self.player2, 5, 8)
+        other = isolation.Board(self.player2, self.player1, 5, 8)
+        neighbors, cells = isolation.knight_neighbors(5, 8)
+        self.assertIs(game._neighbors, other._neighbors)
+        self.assertIs(game._neighbors, neighbors)
+        self.assertEqual(cells[9], (1, 1))
+        self.assertEqual(sorted(cells[n] for n in neighbors[9]),
+                         [(0, 3), (2, 3), (3, 0), (3, 2)])
+
+    def test_zobrist_key_matches_full_recomputation(self):
+        rng = random.Random(1)
+        game = isolation.Board(self.player1, self.player2, 6, 5)
+        cell_keys, location_keys, side_key = isolation.zobrist_keys(6, 5)
+        while True:
+            expected = side_key if game.move_count % 2 else 0
+            for idx in range(30):
+                if game._board_state[idx]:
+                    expected ^= cell_keys[idx]
+            for player_idx, player in enumerate((self.player1, self.player2)):
+                loc = game.get_player_location(player)
+                if loc is not None:
+                    expected ^= location_keys[player_idx][loc[0] + loc[1] * 5]
+            self.assertEqual(expected, game.hash())
+            moves = game.get_legal_moves()
+            if not moves:
+                break
+            game.apply_move(rng.choice(moves))
+
+    def test_center_distance(self):
+        game = isolation.Board(self.player1, self.player2, 6, 7)
+        game.apply_move((3, 2))
+        game.apply_move((0, 5))
+        self.assertEqual(game_agent.center_distance(game, self.player1), 0.)
+        self.assertEqual(game_agent.center_distance(game, self.player2), 13 ** .5)
+
+        # the table of every geometry is cached, up to a fixed number
+        for width in range(3, 4 + isolation.isolation.MAX_CACHED_GEOMETRIES):
+            game_agent._center_distances(width, 7)
+        self.assertEqual(len(game_agent._CENTER_DISTANCES),
+                         isolation.isolation.MAX_CACHED_GEOMETRIES)
+        self.assertIn((width, 7), game_agent._CENTER_DISTANCES)
+
+    def test_forecast_move_leaves_original_unchanged(self):
+        for cls in (isolation.BitBoard, isolation.CompactBoard):
+            bits = cls(self.player1, self.player2)
+            bits.apply_move((2, 3))
+            child = bits.forecast_move((0, 5))
+            self.assertIsNone(bits.get_player_location(self.player2))
+            self.assertEqual(child.get_player_location(self.player2), (0, 5))
+            self.assertNotEqual(bits.hash(), child.hash())
+            self.assertIn((0, 5), bits.get_blank_spaces())
+            self.assertNotIn((0, 5), child.get_blank_spaces())
+
+    def test_boards_copy_and_pickle(self):
+        for cls in (isolation.Board, isolation.BitBoard, isolation.CompactBoard):
+            game = cls(self.player1, self.player2)
+            game.apply_move((2, 3))
+            if cls is isolation.CompactBoard:
+                # every attribute lives in a slot
+                self.assertEqual(vars(game.forecast_move((0, 5))), {})
+            for other in (game.copy(), pickle.loads(pickle.dumps(game))):
+                self.assertIs(type(other), cls)
+                self.assertEqual(other.get_state(), game.get_state())
+                self.assertEqual(other.hash(), game.hash())
+
+    def test_canonical_key_is_shared_by_symmetric_positions(self):
+        for width, height in [(7, 7), (5, 8)]:
+            game = isolation.Board(self.player1, self.player2, width, height)
+            for move in [(0, 1), (2, 3), (1, 4)]:
+                game.apply_move(move)
+            key, symmetry = game.canonical_key()
+            symmetries = isolation.board_symmetries(width, height)
+            self.assertEqual(len(symmetries), 8 if width == height else 4)
+            for image in symmetries:
+                for cls in (isolation.Board, isolation.BitBoard,
+                            isolation.CompactBoard):
+                    other = cls(self.player1, self.player2, width, height)
+                    for move in [(0, 1), (2, 3), (1, 4)]:
+                        other.apply_move(other._cells[image.forward[
+                            move[0] + move[1] * height]])
+                    other_key, other_symmetry = other.canonical_key()
+                    self.assertEqual(key, other_key)
+                    for move in game.get_legal_moves():
+                        canonical = game.to_canonical(move, symmetry)
+                        self.assertEqual(
+                            other.from_canonical(canonical, other_symmetry),
+                            other._cells[image.forward[move[0] + move[1] * height]])
+
+    def test_state_round_trip(self):
+        game = isolation.Board(self.player1, self.player2, 6, 5)
+        for move in [(2, 2), (0, 0), (4, 3)]:
+            game.apply_move(move)
+        state = game.get_state()
+        for cls in (isolation.Board, isolation.BitBoard,
+                    isolation.CompactBoard):
+            copy = cls.from_state(self.player1, self.player2, state)
+            self.assertEqual(copy.get_state(), state)
+            self.assertEqual(copy.hash(), game.hash())
+            self.assertEqual(copy.to_string(), game.to_string())
+            self.assertIs(copy.active_player, self.player2)
+
+
+class TournamentTest(unittest.TestCase):
+    """Check the scheduling of tournament games"""
+
+    def test_serial_and_parallel_schedules_match(self):
+        class Games(list):
+            write = list.append
+
+        def play(pool):
+            cpu_agents = [
+                tournament.Agent(sample_players.RandomPlayer(), "Random_1"),
+                tournament.Agent(sample_players.RandomPlayer(), "Random_2")]
+            test_agents = [
+                tournament.Agent(sample_players.RandomPlayer(), "Random_3")]
+            games = Games()
+            with contextlib.redirect_stdout(io.StringIO()):
+                tournament.play_matches(cpu_agents, test_agents, 2, pool,
+                                        games=games, seed=7)
+            return [(record.state, record.moves, record.winner,
+                     record.players) for record in games]
+
+        serial = play(None)
+        with multiprocessing.Pool(2) as pool:
+            parallel = play(pool)
+        self.assertEqual(len(serial), 8)
+        self.assertEqual(serial, parallel)
+
+
+class BatchSimulatorTest(unittest.TestCase):
+    """Check the NumPy batch simulator against the Board rules"""
+
+    @unittest.skipIf(numpy is None, "batch_simulator requires NumPy")
+    def test_batch_simulator_follows_board_rules(self):
+        import batch_simulator
+        for policy in batch_simulator.POLICIES:
+            positions = batch_simulator.simulate(20, 5, 6, policy, seed=0)
+            own, opp = batch_simulator.mobility(positions)
+            scores = batch_simulator.score_positions(
+                lambda game, player: game.utility(player) or
+                game.mobility(player) - game.mobility(game.get_opponent(player)),
+                positions)
+            self.assertTrue(numpy.array_equal(scores[own > 0], (own - opp)[own > 0]))
+            self.assertTrue((scores[own == 0] == float("-inf")).all())
+            self.assertTrue((positions.result[own == 0] == -1).all())
+            self.assertEqual((own == 0).sum(), 20)
+
+
+class HeuristicTuningTest(unittest.TestCase):
+    """Check the position dataset and the fit of tuned weights"""
+
+    def setUp(self):
+        self.player1 = "Player1"
+        self.player2 = "Player2"
+
+    @unittest.skipIf(numpy is None, "fitting weights requires NumPy")
+    def test_position_dataset_and_fit(self):
+        rng = random.Random(0)
+        dataset = heuristic_tuning.PositionDataset(5, 5)
+        for _ in range(40):
+            game = isolation.Board(self.player1, self.player2, 5, 5,
+                                   shuffle=False)
+            moves = []
+            while game.get_legal_moves():
+                # player 1 plays the move that keeps the most options open
+                legal = game.get_legal_moves()
+                if game.active_player == self.player1:
+                    move = max(legal, key=lambda m: game.forecast_move(m).mobility(
+                        self.player1))
+                else:
+                    move = rng.choice(legal)
+                moves.append(move)
+                game.apply_move(move)
+            dataset.add_game(moves, int(game.active_player == self.player1))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "positions.bin")
+            dataset.save(path)
+            dataset.save(path, append=True)
+            loaded = heuristic_tuning.PositionDataset.load(path)
+        self.assertEqual(loaded.records, dataset.records * 2)
+        score_fn, report = heuristic_tuning.fit(dataset)
+        own_moves, opp_moves = score_fn.weights[:2]
+        self.assertGreater(own_moves, 0)
+        self.assertLess(opp_moves, 0)
+        self.assertGreater(report["accuracy"], .5)
+
+
+class GameRecordTest(unittest.TestCase):
+    """Check the recording and replay of finished games"""
+
+    def test_game_records_replay_positions(self):
+        player1 = game_agent.AlphaBetaPlayer(score_fn=game_agent.custom_score)
+        player2 = game_agent.AlphaBetaPlayer(score_fn=game_agent.custom_score)
+        game = isolation.Board(player1, player2, 5, 5)
+        game.apply_move((1, 1))
+        game.apply_move((3, 2))
+        records = []
+        winner, history, termination = game.play(record=records.append)
+        record = records[0]
+        self.assertEqual(record.moves, [tuple(move) for move in history])
+        self.assertEqual(len(record.times), len(history) + 1)
+        self.assertEqual(record.winner, int(winner is player2))
+        self.assertEqual(record.termination, termination)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ("games.jsonl", "games.jsonl.gz"):
+                path = os.path.join(tmp, name)
+                with isolation.GameRecordWriter(path) as writer:
+                    writer.write(record._replace(players=["a", "b"]))
+                    writer.write(record)
+                loaded = list(isolation.read_records(path))
+                self.assertEqual(len(loaded), 2)
+                self.assertEqual(loaded[1].moves, record.moves)
+                self.assertEqual(loaded[0].players, ["a", "b"])
+
+        final = isolation.replay(loaded[1], board_class=isolation.BitBoard)
+        self.assertEqual(final.get_state(), game.get_state())
+        self.assertEqual(isolation.replay(record, 0).get_state(), record.state)
+        for ply, (position, move) in enumerate(isolation.positions(record)):
+            self.assertEqual(position.move_count, 2 + ply)
+            if move is not None:
+                self.assertIn(move, position.get_legal_moves())
+
+
+class BenchmarkTest(unittest.TestCase):
+    """Check the benchmark suite and the baseline comparison"""
+
+    def test_benchmark_suite(self):
+        games = benchmark.positions("mid", 5, seed=1)
+        again = benchmark.positions("mid", 5, seed=1,
+                                    board_class=isolation.BitBoard)
+        self.assertEqual([g.get_state() for g in games],
+                         [g.get_state() for g in again])
+        self.assertTrue(all(g.move_count == benchmark.PHASES["mid"] and
+                            g.get_legal_moves() for g in games))
+
+        report = benchmark.run_suite(count=3, repeat=1, depth=2,
+                                     phases=["early"], sizes=[5, 7])
+        search = report["results"]["7x7/early/alphabeta_depth_2"]
+        self.assertEqual(search["nodes"],
+                         benchmark.search_nodes(benchmark.positions("early", 3), 2))
+        self.assertGreater(report["results"]["5x5/early/get_legal_moves"]["ops_per_sec"], 0)
+        self.assertEqual(benchmark.compare(report, report)[1], [])
+
+        slower = {"settings": report["settings"], "results": {
+            name: dict(result, ops_per_sec=2 * result["ops_per_sec"])
+            for name, result in report["results"].items()}}
+        slower["results"]["7x7/early/alphabeta_depth_2"]["nodes"] += 1
+        lines, regressions = benchmark.compare(report, slower)
+        self.assertEqual(len(lines), len(report["results"]))
+        self.assertEqual(len(regressions), len(report["results"]) + 1)
+
+
+class ParallelAgentTest(unittest.TestCase):
+    """Check the multi-process search of ParallelAlphaBetaPlayer"""
+
+    def test_get_move_reports_deepest_iteration_of_all_processes(self):
+        player = parallel_agent.ParallelAlphaBetaPlayer(workers=2)
+        self.addCleanup(player.close)
+        game = isolation.Board(player, game_agent.AlphaBetaPlayer(),
+                               shuffle=False)
+        game.apply_move((3, 3))
+        game.apply_move((2, 2))
+        player.start()
+        processes = list(player._processes)
+        self.assertEqual(len(processes), 2)
+
+        # every reading of the fake clock takes 1 ms off the turn
+        readings = itertools.count()
+        time_left = lambda: 200. - next(readings)
+        move = player.get_move(game, time_left)
+        self.assertIn(move, game.get_legal_moves())
+        self.assertGreater(time_left(), 0)
+        self.assertEqual(len(player.worker_depths), 2)
+        self.assertGreater(player.completed_depth, 0)
+        self.assertEqual(player.completed_depth,
+                         max([len(player.depth_nodes)] + player.worker_depths))
+
+        player.close()
+        self.assertFalse(any(process.is_alive() for process in processes))
+        self.assertEqual(player._conns, [])
+
+    def test_get_move_uses_the_turn(self):
+        player = parallel_agent.ParallelAlphaBetaPlayer(workers=1)
+        self.addCleanup(player.close)
+        game = isolation.Board(player, game_agent.AlphaBetaPlayer(),
+                               shuffle=False)
+        game.apply_move((3, 3))
+        game.apply_move((2, 2))
+        player.start()
+
+        deadline = time.perf_counter() + 0.15
+        time_left = lambda: 1000. * (deadline - time.perf_counter())
+        move = player.get_move(game, time_left)
+        left = time_left()
+        self.assertIn(move, game.get_legal_moves())
+        self.assertGreater(left, 0)
+        # the search runs until TIMER_THRESHOLD instead of stopping after
+        # the iteration that was predicted to be the last
+        self.assertLess(left, 3 * player.TIMER_THRESHOLD)
+
+    def test_default_workers(self):
+        player = parallel_agent.ParallelAlphaBetaPlayer()
+        self.assertEqual(player.workers,
+                         max(1, multiprocessing.cpu_count() - 1))
+
+
+class PonderingTest(unittest.TestCase):
+    """Check pondering on the opponent's time"""
+
+    def test_play_pondering_protocol(self):
+        class PonderingPlayer(game_agent.AlphaBetaPlayer):
+            def __init__(self):
+                super().__init__(search_depth=1)
+                self.events = []
+
+            def ponder(self, game):
+                # the position after the player's own move
+                if game.inactive_player is self:
+                    self.events.append(("ponder", game.move_count))
+
+            def stop_pondering(self):
+                self.events.append(("stop", None))
+
+            def get_move(self, game, time_left):
+                self.events.append(("move", game.move_count))
+                return super().get_move(game, time_left)
+
+        player = PonderingPlayer()
+        opponent = game_agent.AlphaBetaPlayer()
+        game = isolation.Board(player, opponent, 5, 5)
+        game.play()
+        # the player moves on even move counts, ponders right after every
+        # move and stops before each of its turns and once the game is over
+        events = player.events
+        moves = [count for kind, count in events if kind == "move"]
+        self.assertEqual(moves, list(range(0, 2 * len(moves), 2)))
+        self.assertEqual(events[-1], ("stop", None))
+        self.assertIn(("ponder", 1), events)
+        for i, (kind, count) in enumerate(events):
+            if kind == "move":
+                self.assertEqual(events[i - 1], ("stop", None))
+            elif kind == "ponder":
+                self.assertEqual(events[i - 1], ("move", count - 1))
+
+    def test_parallel_player_ponders_into_shared_table(self):
+        player = parallel_agent.ParallelAlphaBetaPlayer(workers=1,
+                                                        pondering=True)
+        self.addCleanup(player.close)
+        # ponder even when the opponent has no core of its own
+        player.PONDER_SPARE_CORES = 0
+        game = isolation.Board(player, game_agent.AlphaBetaPlayer(),
+                               shuffle=False)
+        game.apply_move((3, 3))
+        game.apply_move((2, 2))
+        deadline = timeit.default_timer() + 0.1
+        game.apply_move(player.get_move(
+            game, lambda: 1000 * (deadline - timeit.default_timer())))
+
+        reply = player.tt.probe(game.hash() ^ player._tt_salt)[3]
+        predicted = game.forecast_move(reply)
+        before = player.tt.probe(predicted.hash() ^ player._tt_salt)
+        player.ponder(game.copy())
+        self.assertEqual(player.ponder_moves, 1)
+        time.sleep(0.2)
+        entry = player.tt.probe(predicted.hash() ^ player._tt_salt)
+        self.assertIsNotNone(entry)
+        self.assertGreater(entry[0], before[0] if before else 0)
+
+        # the worker acknowledges the stop and the next search runs normally
+        ponder_job = player._ponder_job
+        player.stop_pondering()
+        self.assertIsNone(player._ponder_job)
+        conn = player._conns[0]
+        while True:
+            self.assertTrue(conn.poll(1.))
+            job_id, depth, _ = conn.recv()
+            if job_id == ponder_job and depth is None:
+                break
+        game.apply_move(reply)
+        deadline = timeit.default_timer() + 0.1
+        move = player.get_move(
+            game, lambda: 1000 * (deadline - timeit.default_timer()))
+        self.assertIn(move, game.get_legal_moves())
+        self.assertEqual(player.ponder_hits, 1)
+
+    def test_pondering_is_skipped_without_spare_cores(self):
+        player = parallel_agent.ParallelAlphaBetaPlayer(workers=1,
+                                                        pondering=True)
+        self.addCleanup(player.close)
+        player.PONDER_SPARE_CORES = multiprocessing.cpu_count()
+        game = isolation.Board(player, game_agent.AlphaBetaPlayer())
+        player.start()
+        game.apply_move((3, 3))
+        with self.assertWarns(UserWarning):
+            player.ponder(game)
+        self.assertEqual(player.ponder_moves, 0)
+
 
 if __name__ == '__main__':
     unittest.main()
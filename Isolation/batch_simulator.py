@@ -0,0 +1,346 @@
+"""Simulate thousands of Isolation games in lockstep with NumPy.
+
+`BatchBoard` stores a batch of boards as arrays (one row of blocked cells
+and one pair of player cells per board) and advances all of them by one ply
+per call to step(), computing the legal moves of every board at once from
+the knight move table. `simulate()` plays a batch of self-play games and
+returns every position reached together with the eventual result, and
+`score_positions()` / `evaluate_scores()` measure how well a heuristic
+predicts those results, e.g. to compare the `custom_score` variants of
+`game_agent.py` without playing full tournaments::
+
+    python batch_simulator.py --games 5000 --policy greedy
+
+Cells use the flat index of `isolation.Board` (idx = row + column *
+height). Index `width * height` is a sentinel cell that is always blocked,
+which pads the knight move table to 8 entries per cell.
+"""
+import argparse
+import timeit
+from collections import namedtuple
+
+import numpy as np
+
+from isolation import Board, knight_neighbors
+from isolation.isolation import _cache_tables
+
+# Positions collected by simulate(): blocked is a (positions, cells) bool
+# array, locations a (positions, 2) array with the cell of player 1 and
+# player 2, move_count the number of moves played, and result is +1 if the
+# player to move went on to win the game and -1 otherwise
+PositionSet = namedtuple("PositionSet", ["width", "height", "blocked",
+                                         "locations", "move_count",
+                                         "result"])
+
+# Move selection policies supported by BatchBoard.step()
+POLICIES = ("random", "greedy")
+
+# Knight move tables padded with the sentinel cell, per (width, height);
+# holds at most isolation.isolation.MAX_CACHED_GEOMETRIES geometries
+_MOVE_TABLES = {}
+
+
+def move_table(width, height):
+    """Return a (cells + 1, 8) int array whose row i lists the cells a
+    knight can reach from cell i, padded with the sentinel cell; the row of
+    the sentinel itself only holds the sentinel.
+    """
+    key = (width, height)
+    table = _MOVE_TABLES.get(key)
+    if table is None:
+        neighbors, _ = knight_neighbors(width, height)
+        sentinel = width * height
+        table = np.full((sentinel + 1, 8), sentinel, dtype=np.intp)
+        for idx, adjacent in enumerate(neighbors):
+            table[idx, :len(adjacent)] = adjacent
+        table.flags.writeable = False
+        _cache_tables(_MOVE_TABLES, key, table)
+    return table
+
+
+class BatchBoard:
+    """A batch of Isolation boards that advance one ply at a time in
+    lockstep.
+
+    Every board starts with both players placed on random distinct cells
+    (the first two plies of a game), so all boards have the same move count
+    until they finish.
+
+    Parameters
+    ----------
+    size : int
+        The number of boards in the batch.
+
+    width, height : int (optional)
+        The board size.
+
+    rng : numpy.random.Generator (optional)
+        The random generator used for the openings and the move policies.
+
+    Attributes
+    ----------
+    blocked : numpy.ndarray
+        (size, cells + 1) bool array of blocked cells, including the
+        sentinel.
+
+    locations : numpy.ndarray
+        (size, 2) array with the cell of player 1 and player 2.
+
+    winner : numpy.ndarray
+        (size,) array with the index (0 or 1) of the winner of every finished
+        game, and -1 for games still in progress.
+    """
+
+    def __init__(self, size, width=7, height=7, rng=None):
+        self.size = size
+        self.width = width
+        self.height = height
+        self.rng = np.random.default_rng() if rng is None else rng
+        self._moves = move_table(width, height)
+        self._rows = np.arange(size)
+        cells = width * height
+        self.blocked = np.zeros((size, cells + 1), dtype=bool)
+        self.blocked[:, cells] = True
+        first = self.rng.integers(cells, size=size)
+        second = (first + self.rng.integers(1, cells, size=size)) % cells
+        self.locations = np.stack([first, second], axis=1)
+        self.blocked[self._rows, first] = True
+        self.blocked[self._rows, second] = True
+        self.move_count = 2
+        self.winner = np.full(size, -1, dtype=np.int8)
+
+    @property
+    def done(self):
+        """Bool array telling which games have finished."""
+        return self.winner >= 0
+
+    def legal_moves(self, side):
+        """Return (candidates, legal): the (size, 8) arrays of the cells a
+        knight can reach from the location of player `side` (0 or 1) on
+        every board, and whether each of them is open.
+        """
+        candidates = self._moves[self.locations[:, side]]
+        return candidates, ~self.blocked[self._rows[:, None], candidates]
+
+    def mobility(self, side):
+        """Return the number of legal moves of player `side` on every
+        board.
+        """
+        return self.legal_moves(side)[1].sum(axis=1)
+
+    def step(self, policy="random"):
+        """Play one move on every unfinished board and record the winner of
+        the games where the player to move has no legal move.
+
+        With the "random" policy moves are chosen uniformly; with "greedy"
+        each player picks the move that maximizes its own mobility minus
+        the opponent's after the move (ties broken at random).
+
+        Returns
+        -------
+        bool
+            True while some game is still in progress.
+        """
+        side = self.move_count % 2
+        candidates, legal = self.legal_moves(side)
+        stuck = ~legal.any(axis=1) & ~self.done
+        self.winner[stuck] = 1 - side
+        active = ~self.done
+        if not active.any():
+            return False
+
+        noise = self.rng.random(legal.shape)
+        if policy == "greedy":
+            score = self._greedy_scores(side, candidates) + noise
+        elif policy == "random":
+            score = noise
+        else:
+            raise ValueError("Unknown policy {!r}; expected one of {}".format(
+                policy, POLICIES))
+        score[~legal] = -np.inf
+        moves = candidates[self._rows, score.argmax(axis=1)]
+
+        rows = self._rows[active]
+        self.blocked[rows, moves[active]] = True
+        self.locations[rows, side] = moves[active]
+        self.move_count += 1
+        return True
+
+    def positions(self, mask=None):
+        """Return copies of (blocked cells without the sentinel, locations)
+        for the boards selected by the bool array mask (all by default).
+        """
+        if mask is None:
+            mask = slice(None)
+        return (self.blocked[mask, :-1].copy(), self.locations[mask].copy())
+
+    def _greedy_scores(self, side, candidates):
+        """Score every candidate move by the mover's mobility after the move
+        minus the opponent's.
+        """
+        rows = self._rows[:, None]
+        own = (~self.blocked[rows[:, :, None], self._moves[candidates]]).sum(axis=2)
+        opp_candidates, opp_legal = self.legal_moves(1 - side)
+        opp = opp_legal.sum(axis=1)[:, None] - (
+            (opp_candidates[:, None, :] == candidates[:, :, None]) &
+            opp_legal[:, None, :]).any(axis=2)
+        return (own - opp).astype(float)
+
+
+def simulate(games, width=7, height=7, policy="random", seed=None):
+    """Play a batch of self-play games and collect every position reached
+    after the opening, labeled with the final result.
+
+    Parameters
+    ----------
+    games : int
+        The number of games to play.
+
+    width, height : int (optional)
+        The board size.
+
+    policy : str (optional)
+        The move policy of both players (see BatchBoard.step()).
+
+    seed : int (optional)
+        Seed of the random generator.
+
+    Returns
+    -------
+    PositionSet
+    """
+    batch = BatchBoard(games, width, height, np.random.default_rng(seed))
+    blocked, locations, move_count, game_index = [], [], [], []
+    while True:
+        active = ~batch.done
+        cells, locs = batch.positions(active)
+        blocked.append(cells)
+        locations.append(locs)
+        move_count.append(np.full(len(locs), batch.move_count))
+        game_index.append(np.flatnonzero(active))
+        if not batch.step(policy):
+            break
+    move_count = np.concatenate(move_count)
+    winner = batch.winner[np.concatenate(game_index)]
+    # Positions where the game had already ended when they were recorded
+    # are final positions (the player to move has lost), and are kept
+    result = np.where(winner == move_count % 2, 1, -1).astype(np.int8)
+    return PositionSet(width, height, np.concatenate(blocked),
+                       np.concatenate(locations), move_count, result)
+
+
+def mobility(positions):
+    """Return the (own, opp) number of legal moves of the player to move and
+    of its opponent for every position in a PositionSet, vectorized.
+    """
+    table = move_table(positions.width, positions.height)
+    blocked = np.pad(positions.blocked, ((0, 0), (0, 1)), constant_values=True)
+    rows = np.arange(len(blocked))[:, None]
+    side = positions.move_count % 2
+    counts = []
+    for player in (side, 1 - side):
+        candidates = table[positions.locations[np.arange(len(blocked)), player]]
+        counts.append((~blocked[rows, candidates]).sum(axis=1))
+    return counts[0], counts[1]
+
+
+class _Player:
+    """Placeholder player registered on the boards built by
+    score_positions().
+    """
+
+
+def score_positions(score_fn, positions, board_class=Board):
+    """Evaluate a `score_fn(game, player)` heuristic, such as the functions
+    in `game_agent.py`, on every position of a PositionSet from the point of
+    view of the player to move.
+
+    Returns
+    -------
+    numpy.ndarray
+        The heuristic value of every position.
+    """
+    player_1, player_2 = _Player(), _Player()
+    scores = np.empty(len(positions.result))
+    for i, (blocked, locations, move_count) in enumerate(zip(
+            positions.blocked, positions.locations, positions.move_count)):
+        state = {"width": positions.width, "height": positions.height,
+                 "move_count": int(move_count),
+                 "blocked": np.flatnonzero(blocked).tolist(),
+                 "locations": locations.tolist()}
+        game = board_class.from_state(player_1, player_2, state, shuffle=False)
+        scores[i] = score_fn(game, game.active_player)
+    return scores
+
+
+def evaluate_scores(scores, positions):
+    """Measure how well heuristic values predict the results of a
+    PositionSet.
+
+    Returns
+    -------
+    dict
+        "accuracy": the fraction of positions with a nonzero score whose
+        sign matches the result, "ties": the fraction of positions scored 0,
+        and "correlation": the correlation coefficient of the scores (with
+        infinite values clipped to the finite range) and the results.
+    """
+    scores = np.asarray(scores, dtype=float)
+    result = positions.result
+    decided = scores != 0
+    finite = scores[np.isfinite(scores)]
+    bound = np.abs(finite).max() + 1 if len(finite) else 1.
+    clipped = np.clip(scores, -bound, bound)
+    correlation = (np.corrcoef(clipped, result)[0, 1]
+                   if clipped.std() and result.std() else 0.)
+    return {
+        "accuracy": float((np.sign(scores[decided]) == result[decided]).mean())
+                    if decided.any() else 0.,
+        "ties": float(1 - decided.mean()),
+        "correlation": float(correlation),
+    }
+
+
+def main():
+    from game_agent import custom_score, custom_score_2, custom_score_3
+    from sample_players import improved_score, open_move_score, center_score
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--games", type=int, default=2000)
+    parser.add_argument("--policy", choices=POLICIES, default="random")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--width", type=int, default=7)
+    parser.add_argument("--height", type=int, default=7)
+    args = parser.parse_args()
+
+    start = timeit.default_timer()
+    positions = simulate(args.games, args.width, args.height, args.policy,
+                         args.seed)
+    elapsed = timeit.default_timer() - start
+    print("Simulated {} games ({} positions) in {:.2f}s".format(
+        args.games, len(positions.result), elapsed))
+
+    print("\n{:<16}{:>10}{:>8}{:>13}{:>10}".format(
+        "Heuristic", "Accuracy", "Ties", "Correlation", "Time"))
+    own, opp = mobility(positions)
+    heuristics = [("improved (vec)", lambda: own - opp)]
+    for name, score_fn in [("open_move", open_move_score),
+                           ("center", center_score),
+                           ("improved", improved_score),
+                           ("custom", custom_score),
+                           ("custom_2", custom_score_2),
+                           ("custom_3", custom_score_3)]:
+        heuristics.append((name, lambda score_fn=score_fn: score_positions(
+            score_fn, positions)))
+    for name, compute in heuristics:
+        start = timeit.default_timer()
+        scores = compute()
+        elapsed = timeit.default_timer() - start
+        result = evaluate_scores(scores, positions)
+        print("{:<16}{:>10.3f}{:>8.3f}{:>13.3f}{:>9.2f}s".format(
+            name, result["accuracy"], result["ties"], result["correlation"],
+            elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,412 @@
+"""Benchmark the Isolation board operations and the alpha-beta search.
+
+Every benchmark runs over fixed sets of positions generated by seeded random
+play, so all runs measure the same positions: "opening" positions where the
+second player is about to pick its starting cell, "early" positions after 4
+moves, "mid" positions after 14 and "late" positions after 24. The suite
+measures the throughput of get_legal_moves(), forecast_move(), utility(),
+the heuristics of `game_agent.py` and `sample_players.py`, and fixed-depth
+alpha-beta search, and can compare the
+results with a baseline saved by an earlier run to catch regressions::
+
+    python benchmark.py --output baseline.json
+    ... change the code ...
+    python benchmark.py --baseline baseline.json
+
+Pass several board sizes to see how the cost of every operation grows with
+the board::
+
+    python benchmark.py --sizes 7 11 15 21
+
+The comparison exits with status 1 if a benchmark got slower than the
+baseline by more than the tolerance, or if the number of nodes searched by
+alpha-beta changed (which means the search itself behaves differently).
+Timings are only comparable between runs on the same, otherwise idle
+machine; on shared or virtual machines raise --repeat and --tolerance.
+"""
+import argparse
+import gc
+import itertools
+import json
+import platform
+import random
+import sys
+import timeit
+
+from isolation import Board, BitBoard, CompactBoard
+from game_agent import (AlphaBetaPlayer, custom_score, custom_score_2,
+                        custom_score_3)
+from sample_players import improved_score
+
+# Number of moves played to reach the positions of each game phase
+PHASES = {"opening": 1, "early": 4, "mid": 14, "late": 24}
+
+# Maximum search depth per phase; the player to move in the opening can pick
+# any blank cell, so deep searches of it take too long on large boards
+MAX_SEARCH_DEPTHS = {"opening": 2}
+
+BOARDS = {"board": Board, "bitboard": BitBoard, "compact": CompactBoard}
+
+HEURISTICS = {
+    "improved_score": improved_score,
+    "custom_score": custom_score,
+    "custom_score_2": custom_score_2,
+    "custom_score_3": custom_score_3,
+}
+
+
+class _Player:
+    """Placeholder player registered on the benchmark boards."""
+
+
+def positions(phase, count=50, seed=0, width=7, height=7, board_class=Board):
+    """Return `count` boards in positions reached by seeded random play.
+
+    Parameters
+    ----------
+    phase : str
+        A key of PHASES selecting the number of moves played.
+
+    count : int (optional)
+        The number of positions.
+
+    seed : int (optional)
+        Seed of the random play; the same arguments always produce the same
+        positions.
+
+    width, height : int (optional)
+        The board size.
+
+    board_class : class (optional)
+        The board implementation to build. The positions are played on a
+        Board and copied, so they are the same for every implementation.
+
+    Returns
+    -------
+    list<isolation.Board>
+        Boards where the player to move has at least one legal move.
+    """
+    rng = random.Random("{}-{}".format(seed, phase))
+    games = []
+    while len(games) < count:
+        game = Board(_Player(), _Player(), width, height, shuffle=False)
+        for _ in range(PHASES[phase]):
+            moves = game.get_legal_moves()
+            if not moves:
+                break
+            game.apply_move(rng.choice(moves))
+        if game.move_count == PHASES[phase] and game.get_legal_moves():
+            games.append(board_class.from_state(_Player(), _Player(),
+                                                game.get_state(),
+                                                shuffle=False))
+    return games
+
+
+def _loop_time(run, number):
+    """Return the time taken by `number` calls of a run (see _best_times())."""
+    timer = timeit.default_timer
+    if isinstance(run, tuple):
+        setup, run = run
+        total = 0.
+        for _ in range(number):
+            arg = setup()
+            start = timer()
+            run(arg)
+            total += timer() - start
+        return total
+    start = timer()
+    for _ in range(number):
+        run()
+    return timer() - start
+
+
+def _best_times(runs, repeat, min_time=0.02):
+    """Return the time of one call of every run in runs, in seconds.
+
+    A run is a function, or a pair (setup, run) where the result of setup()
+    is passed to run() before every call and only run() is timed. Every run
+    is called in a loop long enough to take at least min_time seconds, and
+    the loops of all runs are timed in `repeat` interleaved rounds, keeping
+    the fastest time of each. Interleaving spreads every benchmark over the
+    whole run, so a slow period of the machine does not skew a single
+    benchmark. The garbage collector is disabled while timing, as in the
+    timeit module.
+    """
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        numbers = []
+        for run in runs:
+            number = 1
+            while _loop_time(run, number) < min_time:
+                number *= 2
+            numbers.append(number)
+        best = [float("inf")] * len(runs)
+        for _ in range(repeat):
+            for i, (run, number) in enumerate(zip(runs, numbers)):
+                best[i] = min(best[i], _loop_time(run, number) / number)
+        return best
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+# Each bench_* function takes a list of boards and returns (run, ops): a
+# function performing `ops` operations on the boards, to be timed
+
+def bench_legal_moves(games):
+    def run():
+        for game in games:
+            game.get_legal_moves()
+    return run, len(games)
+
+
+def bench_forecast_move(games):
+    moves = [(game, game.get_legal_moves()) for game in games]
+
+    def run():
+        for game, legal_moves in moves:
+            for move in legal_moves:
+                game.forecast_move(move)
+    return run, sum(len(legal_moves) for _, legal_moves in moves)
+
+
+def bench_utility(games):
+    def run():
+        for game in games:
+            game.utility(game.active_player)
+    return run, len(games)
+
+
+def bench_heuristic(score_fn):
+    def bench(games):
+        def run():
+            for game in games:
+                score_fn(game, game.active_player)
+        return run, len(games)
+    return bench
+
+
+def search_setup(games, score_fn=custom_score):
+    """Return a (player, game) pair for every position, where player is a
+    new AlphaBetaPlayer with an empty transposition table and game a copy of
+    the position with that player to move.
+    """
+    searches = []
+    for game in games:
+        player = AlphaBetaPlayer(score_fn=score_fn, tt_bytes=2**20)
+        state = game.get_state()
+        if state["move_count"] % 2:
+            game = type(game).from_state(_Player(), player, state, shuffle=False)
+        else:
+            game = type(game).from_state(player, _Player(), state, shuffle=False)
+        searches.append((player, game))
+    return searches
+
+
+def search(searches, depth):
+    """Search the positions of search_setup() with fixed-depth alpha-beta
+    (iterative deepening from depth 1, as in a game) and return the number
+    of nodes searched. The players keep their tables, so every result of
+    search_setup() must only be searched once.
+    """
+    nodes = 0
+    for player, game in searches:
+        player._start_clock(lambda: float("inf"))
+        for d in range(1, depth + 1):
+            player.alphabeta(game, d)
+        nodes += player.nodes
+    return nodes
+
+
+def search_nodes(games, depth, score_fn=custom_score):
+    """Return the number of nodes searched by search() from fresh players."""
+    return search(search_setup(games, score_fn), depth)
+
+
+def run_suite(count=50, seed=0, repeat=5, depth=4, board="board",
+              phases=tuple(PHASES), sizes=(7,)):
+    """Run every benchmark and return the results as a JSON serializable
+    dict.
+
+    Parameters
+    ----------
+    count, seed : int (optional)
+        The number of positions per phase and the seed they are generated
+        from (see positions()).
+
+    repeat : int (optional)
+        Every benchmark is timed this many times and the fastest run is
+        kept, which filters out most of the noise from other processes.
+
+    depth : int (optional)
+        The depth of the alpha-beta searches (capped by MAX_SEARCH_DEPTHS).
+
+    board : str (optional)
+        A key of BOARDS selecting the board implementation.
+
+    phases : sequence of str (optional)
+        The game phases to benchmark.
+
+    sizes : sequence of int (optional)
+        The sizes of the square boards to benchmark.
+
+    Returns
+    -------
+    dict
+        "settings" holds the arguments and the Python version, and
+        "results" maps names of the form "<size>x<size>/<phase>/<benchmark>"
+        to a dict with the number of operations timed ("ops"),
+        "ops_per_sec" and "us_per_op"; search benchmarks also report the
+        "nodes" searched.
+    """
+    benchmarks = [("get_legal_moves", bench_legal_moves),
+                  ("forecast_move", bench_forecast_move),
+                  ("utility", bench_utility)]
+    benchmarks += [(name, bench_heuristic(score_fn))
+                   for name, score_fn in HEURISTICS.items()]
+
+    names, runs, ops, nodes = [], [], [], {}
+    for size, phase in itertools.product(sizes, phases):
+        games = positions(phase, count, seed, size, size, BOARDS[board])
+        prefix = "{0}x{0}/{1}/".format(size, phase)
+        for name, bench in benchmarks:
+            if name in HEURISTICS and PHASES[phase] < 2:
+                # The heuristics assume both players have been placed
+                continue
+            run, count_ops = bench(games)
+            names.append(prefix + name)
+            runs.append(run)
+            ops.append(count_ops)
+
+        phase_depth = min(depth, MAX_SEARCH_DEPTHS.get(phase, depth))
+        name = prefix + "alphabeta_depth_{}".format(phase_depth)
+        nodes[name] = search_nodes(games, phase_depth)
+        names.append(name)
+        # Building the players and their tables is not timed
+        runs.append((lambda games=games: search_setup(games),
+                     lambda searches, phase_depth=phase_depth:
+                     search(searches, phase_depth)))
+        ops.append(nodes[name])
+
+    results = {}
+    for name, count_ops, seconds in zip(names, ops,
+                                        _best_times(runs, repeat)):
+        results[name] = _rates(count_ops, seconds)
+        if name in nodes:
+            results[name]["nodes"] = nodes[name]
+
+    settings = {"count": count, "seed": seed, "repeat": repeat,
+                "depth": depth, "board": board, "sizes": list(sizes),
+                "python": platform.python_version()}
+    return {"settings": settings, "results": results}
+
+
+def _rates(ops, seconds):
+    return {"ops": ops,
+            "ops_per_sec": ops / seconds if seconds else 0.,
+            "us_per_op": 1e6 * seconds / ops if ops else 0.}
+
+
+def compare(current, baseline, tolerance=0.2):
+    """Compare two run_suite() results.
+
+    Returns
+    -------
+    (list<str>, list<str>)
+        A line per benchmark present in both runs with its relative change
+        in speed, and the messages of the regressions: benchmarks slower
+        than the baseline by more than `tolerance` (a fraction), and
+        searches that visited a different number of nodes.
+    """
+    lines, regressions = [], []
+    for name, result in sorted(current["results"].items()):
+        base = baseline["results"].get(name)
+        if base is None or not base["ops_per_sec"]:
+            continue
+        change = result["ops_per_sec"] / base["ops_per_sec"] - 1
+        lines.append("{:<40}{:>14,.0f}{:>14,.0f}{:>+9.1%}".format(
+            name, base["ops_per_sec"], result["ops_per_sec"], change))
+        if change < -tolerance:
+            regressions.append("{} is {:.1%} slower".format(name, -change))
+        if "nodes" in base and result.get("nodes") != base["nodes"]:
+            regressions.append("{} searched {} nodes instead of {}".format(
+                name, result.get("nodes"), base["nodes"]))
+    return lines, regressions
+
+
+def _print_table(report, sizes):
+    """Print the time per operation of every benchmark, with one column per
+    board size.
+    """
+    results = report["results"]
+    benchmarks = sorted({name.split("/", 1)[1] for name in results})
+    print("Time per operation (us)\n")
+    print("{:<32}".format("Benchmark") +
+          "".join("{:>10}".format("{0}x{0}".format(size)) for size in sizes))
+    for benchmark in benchmarks:
+        row = [results.get("{0}x{0}/{1}".format(size, benchmark))
+               for size in sizes]
+        print("{:<32}".format(benchmark) + "".join(
+            "{:>10.2f}".format(result["us_per_op"]) if result else
+            "{:>10}".format("-") for result in row))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--output", metavar="PATH",
+                        help="write the results to PATH as JSON")
+    parser.add_argument("--baseline", metavar="PATH",
+                        help="compare with the results saved in PATH")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="slowdown (as a fraction) reported as a "
+                             "regression")
+    parser.add_argument("--board", choices=sorted(BOARDS),
+                        help="board implementation (default: board, or the "
+                             "one of the baseline)")
+    parser.add_argument("--count", type=int, default=50,
+                        help="number of positions per game phase")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--depth", type=int, default=4,
+                        help="depth of the alpha-beta searches")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[7],
+                        help="sizes of the square boards to benchmark")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        # Measure the same positions on the same board as the baseline
+        settings = baseline["settings"]
+        if args.board not in (None, settings["board"]):
+            parser.error("the baseline was measured with --board {}".format(
+                settings["board"]))
+        args.count, args.seed, args.depth, args.sizes, args.board = (
+            settings["count"], settings["seed"], settings["depth"],
+            settings["sizes"], settings["board"])
+    elif args.board is None:
+        args.board = "board"
+
+    report = run_suite(args.count, args.seed, args.repeat, args.depth,
+                       args.board, sizes=args.sizes)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if baseline is None:
+        _print_table(report, args.sizes)
+        return
+
+    lines, regressions = compare(report, baseline, args.tolerance)
+    print("{:<40}{:>14}{:>14}{:>9}".format("Benchmark", "baseline",
+                                           "current", "change"))
+    print("\n".join(lines))
+    if regressions:
+        print("\nRegressions:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
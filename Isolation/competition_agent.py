@@ -4,8 +4,11 @@ champions) in a tournament.
 
          COMPLETING AND SUBMITTING A COMPETITION AGENT IS OPTIONAL
 """
+import math
 import random
 
+from isolation import Board, knight_neighbors
+
 
 class SearchTimeout(Exception):
     """Subclass base exception for code clarity. """
@@ -36,6 +39,26 @@ def custom_score(game, player):
     raise NotImplementedError
 
 
+class _Node:
+    """A node of the Monte Carlo search tree.
+
+    Moves are stored as cell indices (idx = row + column * height) and each
+    node counts the playouts won by `mover`, the index (0 or 1) of the player
+    who made the move leading to the node.
+    """
+    __slots__ = ("move", "mover", "parent", "children", "untried", "visits",
+                 "wins")
+
+    def __init__(self, move, mover, parent, untried):
+        self.move = move
+        self.mover = mover
+        self.parent = parent
+        self.children = []
+        self.untried = untried
+        self.visits = 0
+        self.wins = 0
+
+
 class CustomPlayer:
     """Game-playing agent to use in the optional player vs player Isolation
     competition.
@@ -49,6 +72,13 @@ class CustomPlayer:
         COMPETITION.  IT IS NOT REQUIRED FOR THE ISOLATION PROJECT REVIEW.
     **************************************************************************
 
+    This agent uses Monte Carlo tree search with the UCT selection rule and
+    uniformly random playouts. The playouts run on a bytearray of blocked
+    cells and the shared knight move tables from `isolation.knight_neighbors`
+    instead of a Board, which makes them several times faster than calling
+    get_legal_moves() and apply_move(). The subtree of the position reached
+    after the opponent's reply is kept for the next turn.
+
     Parameters
     ----------
     data : string
@@ -59,12 +89,40 @@ class CustomPlayer:
         the PvP competition uses more accurate timers that are not cross-
         platform compatible, so a limit of 1ms (vs 10ms for the other classes)
         is generally sufficient.
+
+    exploration : float (optional)
+        The exploration constant of the UCT formula.
+
+    Attributes
+    ----------
+    playouts : int
+        The number of playouts run during the last call to get_move().
+
+    playouts_per_second : float
+        The playout rate of the last call to get_move().
+
+    reused_visits : int
+        The number of playouts inherited from the previous turn by the root
+        of the last search.
     """
 
-    def __init__(self, data=None, timeout=1.):
+    def __init__(self, data=None, timeout=1., exploration=2 ** .5):
         self.score = custom_score
         self.time_left = None
         self.TIMER_THRESHOLD = timeout
+        self.exploration = exploration
+        self.playouts = 0
+        self.playouts_per_second = 0.
+        self.reused_visits = 0
+        self._root = None
+        self._board = None
+
+    def __getstate__(self):
+        # The search tree can be deep enough to exceed the recursion limit of
+        # pickle, and is only valid for the game it was built in
+        state = self.__dict__.copy()
+        state.update(time_left=None, _root=None, _board=None)
+        return state
 
     def get_move(self, game, time_left):
         """Search for the best move from the available legal moves and return a
@@ -93,5 +151,125 @@ class CustomPlayer:
             Board coordinates corresponding to a legal move; may return
             (-1, -1) if there are no available legal moves.
         """
-        # OPTIONAL: Finish this function!
-        raise NotImplementedError
+        self.time_left = time_left
+        start = time_left()
+        neighbors, cells = knight_neighbors(game.width, game.height)
+        state = game.get_state()
+        blocked = bytearray(game.width * game.height)
+        for idx in state["blocked"]:
+            blocked[idx] = 1
+        locations = state["locations"]
+        side = state["move_count"] % 2
+
+        root = self._reuse_tree(game)
+        if root is None:
+            root = _Node(None, side ^ 1, None,
+                         self._legal_moves(neighbors, blocked, locations[side]))
+        self.reused_visits = root.visits
+        if not root.untried and not root.children:
+            self._root = self._board = None
+            return (-1, -1)
+
+        playouts = 0
+        while True:
+            # Always finish at least one playout so that a move is available
+            if playouts and time_left() < self.TIMER_THRESHOLD:
+                break
+            self._playout(root, neighbors, bytearray(blocked),
+                          list(locations), side)
+            playouts += 1
+
+        elapsed = (start - time_left()) / 1000.
+        self.playouts = playouts
+        self.playouts_per_second = playouts / elapsed if elapsed > 0 else 0.
+
+        best = max(root.children, key=lambda child: child.visits)
+        best_move = cells[best.move]
+        best.parent = None
+        self._root = best
+        self._board = game.forecast_move(best_move)
+        return best_move
+
+    def _reuse_tree(self, game):
+        """Return the subtree for the current position from the previous
+        search, or None if the game does not continue from that search.
+        """
+        root, board, self._root, self._board = self._root, self._board, None, None
+        if root is None or board.move_count + 1 != game.move_count:
+            return None
+        opp_move = game.get_player_location(game.inactive_player)
+        if opp_move not in board.get_legal_moves():
+            return None
+        board.apply_move(opp_move)
+        if board.hash() != game.hash():
+            return None
+        opp_idx = opp_move[0] + opp_move[1] * game.height
+        for child in root.children:
+            if child.move == opp_idx:
+                child.parent = None
+                return child
+        return None
+
+    def _playout(self, root, neighbors, blocked, locations, side):
+        """Run one iteration of MCTS from the root: select a leaf with UCT,
+        expand one child, play a random game to the end and back up the
+        result. The blocked cells, locations and side to move describe the
+        root position and are modified in place.
+        """
+        # Selection
+        node = root
+        exploration = self.exploration
+        while not node.untried and node.children:
+            log_visits = math.log(node.visits)
+            node = max(node.children, key=lambda child: (
+                child.wins / child.visits +
+                exploration * math.sqrt(log_visits / child.visits)))
+            blocked[node.move] = 1
+            locations[side] = node.move
+            side ^= 1
+
+        # Expansion
+        if node.untried:
+            move = node.untried.pop()
+            blocked[move] = 1
+            locations[side] = move
+            child = _Node(move, side, node,
+                          self._legal_moves(neighbors, blocked, locations[side ^ 1]))
+            node.children.append(child)
+            node = child
+            side ^= 1
+
+        # Simulation: the first player without a legal move loses
+        choice = random.choice
+        while True:
+            loc = locations[side]
+            if loc is Board.NOT_MOVED:
+                moves = [i for i, cell in enumerate(blocked) if not cell]
+            else:
+                moves = [n for n in neighbors[loc] if not blocked[n]]
+            if not moves:
+                break
+            move = choice(moves)
+            blocked[move] = 1
+            locations[side] = move
+            side ^= 1
+        winner = side ^ 1
+
+        # Backpropagation
+        while node is not None:
+            node.visits += 1
+            if node.mover == winner:
+                node.wins += 1
+            node = node.parent
+
+    @staticmethod
+    def _legal_moves(neighbors, blocked, loc):
+        """Return the cell indices the player at loc can move to, in random
+        order.
+        """
+        if loc is Board.NOT_MOVED:
+            moves = [i for i, cell in enumerate(blocked) if not cell]
+        else:
+            moves = [n for n in neighbors[loc] if not blocked[n]]
+        random.shuffle(moves)
+        return moves
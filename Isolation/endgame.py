@@ -0,0 +1,246 @@
+"""Exact endgame solver for partitioned Isolation positions.
+
+Once no blank cell can be reached by both knights, the players can no longer
+interfere with each other: each of them makes as many moves as the longest
+knight path through its own region allows, and the player to move wins if
+and only if its path is strictly longer than the opponent's. `EndgameSolver`
+detects such positions by flood filling the blank cells from both players
+and computes the longest paths exactly with a memoized depth-first search
+over bit masks of the cells still available.
+
+`EndgamePlayer` is an `AlphaBetaPlayer` that hands the game over to the
+solver as soon as the board is partitioned into small enough regions, and
+plays the first move of its longest path.
+"""
+from isolation import knight_neighbors
+from game_agent import AlphaBetaPlayer, SearchTimeout
+
+
+class EndgameSolver:
+    """Partition detection and exact longest knight paths on one board size.
+
+    Results of the longest path search only depend on the start cell and the
+    set of available cells, so they are memoized across positions, moves and
+    games played on the same board size.
+
+    Parameters
+    ----------
+    width, height : int (optional)
+        The board size.
+
+    max_cells : int (optional)
+        Positions are only solved when the two regions hold at most this many
+        blank cells in total; larger regions can take too long to search.
+
+    max_memo : int (optional)
+        The memo is cleared when it grows past this many entries.
+    """
+    # Number of nodes searched between two checks of the timer
+    CHECK_INTERVAL = 1024
+
+    def __init__(self, width=7, height=7, max_cells=24, max_memo=2**20):
+        neighbors, self._cells = knight_neighbors(width, height)
+        self._masks = tuple(sum(1 << n for n in adjacent)
+                            for adjacent in neighbors)
+        self.width = width
+        self.height = height
+        self.max_cells = max_cells
+        self.max_memo = max_memo
+        self.nodes = 0
+        self._memo = {}
+        self._time_left = None
+        self._threshold = 0.
+
+    def regions(self, game):
+        """Return the bit masks of the blank cells reachable by the active and
+        the inactive player, or None if a player has not been placed yet.
+        """
+        return self._regions(game.get_state())
+
+    def solve(self, game, time_left=None, threshold=0.):
+        """Solve the current position if it is partitioned.
+
+        Parameters
+        ----------
+        game : `isolation.Board`
+            The position to solve.
+
+        time_left : callable (optional)
+            A function returning the milliseconds left in the turn; the
+            search raises `SearchTimeout` once it drops below threshold.
+
+        threshold : float (optional)
+            See time_left.
+
+        Returns
+        -------
+        ((int, int), int, int) or None
+            None if the players share a region or the regions are too large.
+            Otherwise a tuple (move, own_length, opp_length): the first move
+            of the longest path of the active player ((-1, -1) if it has no
+            move), and the length of the longest path of the active and of
+            the inactive player. The active player wins if and only if
+            own_length > opp_length.
+        """
+        state = game.get_state()
+        regions = self._regions(state)
+        if regions is None:
+            return None
+        own_region, opp_region = regions
+        if (own_region & opp_region or
+                bin(own_region | opp_region).count("1") > self.max_cells):
+            return None
+        if len(self._memo) > self.max_memo:
+            self._memo.clear()
+        self._time_left = time_left
+        self._threshold = threshold
+        own, opp = self._locations(state)
+        own_length, first = self.longest_path(own, own_region)
+        opp_length, _ = self.longest_path(opp, opp_region)
+        move = (-1, -1) if first is None else self._cells[first]
+        return move, own_length, opp_length
+
+    def longest_path(self, start, available):
+        """Return (length, first cell) of the longest knight path from cell
+        start through the cells in the bit mask available; the first cell is
+        None if there is no move.
+        """
+        best_length, best_first = 0, None
+        moves = self._masks[start] & available
+        while moves:
+            low = moves & -moves
+            moves ^= low
+            cell = low.bit_length() - 1
+            length = 1 + self._longest(cell, available & ~low)
+            if length > best_length:
+                best_length, best_first = length, cell
+        return best_length, best_first
+
+    def _longest(self, start, available):
+        """Return the length of the longest knight path from start through the
+        available cells.
+        """
+        key = (start, available)
+        length = self._memo.get(key)
+        if length is not None:
+            return length
+        self.nodes += 1
+        if (self._time_left is not None and
+                not self.nodes % self.CHECK_INTERVAL and
+                self._time_left() < self._threshold):
+            raise SearchTimeout()
+        length = 0
+        # A path can never be longer than the number of available cells
+        bound = bin(available).count("1")
+        moves = self._masks[start] & available
+        while moves and length < bound:
+            low = moves & -moves
+            moves ^= low
+            length = max(length, 1 + self._longest(low.bit_length() - 1,
+                                                   available & ~low))
+        self._memo[key] = length
+        return length
+
+    @staticmethod
+    def _locations(state):
+        """Return the cell of the active and of the inactive player."""
+        locations = state["locations"]
+        return locations[::-1] if state["move_count"] % 2 else locations
+
+    def _regions(self, state):
+        """Implement regions() on a Board.get_state() snapshot."""
+        if None in state["locations"]:
+            return None
+        blank = (1 << (self.width * self.height)) - 1
+        for idx in state["blocked"]:
+            blank &= ~(1 << idx)
+        own, opp = self._locations(state)
+        return self._flood(own, blank), self._flood(opp, blank)
+
+    def _flood(self, start, blank):
+        """Return the bit mask of blank cells reachable from cell start."""
+        masks = self._masks
+        reached = 0
+        frontier = masks[start] & blank
+        while frontier:
+            reached |= frontier
+            step = 0
+            while frontier:
+                low = frontier & -frontier
+                frontier ^= low
+                step |= masks[low.bit_length() - 1]
+            frontier = step & blank & ~reached
+        return reached
+
+
+class EndgamePlayer(AlphaBetaPlayer):
+    """AlphaBetaPlayer that plays perfectly once the board is partitioned.
+
+    On every move it first asks an `EndgameSolver` whether the position is
+    partitioned into small enough regions; if so it plays the first move of
+    its longest path, otherwise (or if solving takes more than half of the
+    time left) it searches with `AlphaBetaPlayer.get_move()`.
+
+    Parameters
+    ----------
+    max_cells : int (optional)
+        See `EndgameSolver`.
+
+    See `AlphaBetaPlayer` for the remaining parameters.
+
+    Attributes
+    ----------
+    solution : (int, int) or None
+        The (own_length, opp_length) pair found by the solver for the last
+        move, or None if the move was searched with alpha-beta.
+
+    solved_moves : int
+        The number of moves played by the solver.
+
+    takeover_ply : int or None
+        The move count at which the solver took over the current game.
+    """
+
+    def __init__(self, max_cells=24, **kwargs):
+        super().__init__(**kwargs)
+        self.max_cells = max_cells
+        self.solution = None
+        self.solved_moves = 0
+        self.takeover_ply = None
+        self._solver = None
+        self._last_ply = -1
+
+    def __getstate__(self):
+        # The solver's memo is rebuilt on demand in the receiving process
+        state = super().__getstate__()
+        state["_solver"] = None
+        return state
+
+    def get_move(self, game, time_left):
+        """Return the solver's move for a partitioned position, otherwise
+        search for the best move with `AlphaBetaPlayer.get_move()`.
+        """
+        if game.move_count <= self._last_ply:
+            # A new game has started
+            self.takeover_ply = None
+        self._last_ply = game.move_count
+        solver = self._solver
+        if solver is None or (solver.width, solver.height) != (game.width, game.height):
+            solver = self._solver = EndgameSolver(game.width, game.height,
+                                                  self.max_cells)
+        self.solution = None
+        # Leave at least half of the turn to the alpha-beta search in case the
+        # regions are too hard to solve in time
+        try:
+            result = solver.solve(game, time_left,
+                                  max(self.TIMER_THRESHOLD, time_left() / 2))
+        except SearchTimeout:
+            result = None
+        if result is None:
+            return super().get_move(game, time_left)
+        move, own_length, opp_length = result
+        self.solution = (own_length, opp_length)
+        self.solved_moves += 1
+        if self.takeover_ply is None:
+            self.takeover_ply = game.move_count
+        return move
@@ -1,4 +1,11 @@
+import math
 import random
+import timeit
+
+from collections import namedtuple
+
+from isolation import board_symmetries
+from isolation.isolation import _cache_tables
 
 
 class SearchTimeout(Exception):
@@ -6,6 +13,109 @@ class SearchTimeout(Exception):
     pass
 
 
+# Distance from every cell to the board center, per (width, height); holds
+# at most isolation.isolation.MAX_CACHED_GEOMETRIES geometries
+_CENTER_DISTANCES = {}
+
+
+def _axis_distance(pos, size):
+    """Distance along one axis to the central row/column, or to the nearer of
+    the two central ones when the board size is even.
+    """
+    center = size // 2
+    if not size % 2 and pos < size / 2:
+        center -= 1
+    return abs(pos - center)
+
+
+def center_distance(game, player):
+    """Return the Euclidean distance between the player and the center of the
+    board, read from a table built once per board geometry.
+
+    Parameters
+    ----------
+    game : `isolation.Board`
+        An instance of `isolation.Board` encoding the current state of the
+        game (e.g., player locations and blocked cells).
+
+    player : object
+        A player instance in the current game that has already moved.
+
+    Returns
+    -------
+    float
+        The distance from the player's cell to the center cell (or to the
+        nearest central cell along each axis with an even size).
+    """
+    row, col = game.get_player_location(player)
+    return _center_distances(game.width, game.height)[row + col * game.height]
+
+
+def _center_distances(width, height):
+    """Return the distance from every cell (by flat index) to the center."""
+    distances = _CENTER_DISTANCES.get((width, height))
+    if distances is None:
+        distances = tuple(
+            math.sqrt(_axis_distance(idx // height, width) ** 2 +
+                      _axis_distance(idx % height, height) ** 2)
+            for idx in range(width * height))
+        _cache_tables(_CENTER_DISTANCES, (width, height), distances)
+    return distances
+
+
+def placement_moves(game, limit=None):
+    """Return the moves of an active player that has not been placed yet,
+    keeping a single move from every set of moves that lead to symmetric
+    positions (which have the same game value).
+
+    On an empty board this leaves one move per orbit of the board's
+    symmetries, e.g. 36 instead of 225 on a 15x15 board; for the second
+    player only the symmetries that leave the first player's position
+    unchanged apply. Moves are ordered by distance to the center, and
+    `limit` optionally keeps only that many of the most central ones, which
+    bounds the branching factor of the first two plies on large boards.
+
+    Parameters
+    ----------
+    game : `isolation.Board`
+        An instance of `isolation.Board` encoding the current state of the
+        game (e.g., player locations and blocked cells).
+
+    limit : int (optional)
+        The maximum number of moves to return; None keeps every distinct
+        move.
+
+    Returns
+    -------
+    list<(int, int)>
+        The distinct legal moves, or all legal moves if the active player
+        has already been placed.
+    """
+    if game.get_player_location(game.active_player) is not None:
+        return game.get_legal_moves()
+    state = game.get_state()
+    blocked = set(state["blocked"])
+    locations = [idx for idx in state["locations"] if idx is not None]
+    symmetries = [symmetry.forward for symmetry in
+                  board_symmetries(game.width, game.height)
+                  if all(symmetry.forward[idx] == idx for idx in locations)
+                  and all(symmetry.forward[idx] in blocked for idx in blocked)]
+    distances = _center_distances(game.width, game.height)
+    height = game.height
+    moves = []
+    seen = set()
+    for row, col in sorted(game.get_blank_spaces(),
+                           key=lambda move: distances[move[0] + move[1] * height]):
+        idx = row + col * height
+        if idx in seen:
+            continue
+        seen.update(forward[idx] for forward in symmetries)
+        moves.append((row, col))
+        if len(moves) == limit:
+            break
+    return moves
+
+
 def custom_score(game, player):
     """Calculate the heuristic value of a game state from the point of view
     of the given player.
@@ -30,44 +140,13 @@ def custom_score(game, player):
     float
         The heuristic value of the current game state to the specified player.
     """
-    import math
-
-    if game.is_loser(player):
-        return float("-inf")
-    if game.is_winner(player):
-        return float("inf")
-    player_moves = game.get_legal_moves(player)
-    opponent_moves = game.get_legal_moves(game.get_opponent(player))
+    context = game.evaluation_context(player)
+    if context.utility:
+        return context.utility
 
-    width = game.width
-    height = game.height
-    (player_h, player_w) = game.get_player_location(player)
-
-    if width % 2:
-        w_center = int(width / 2)
-        dist_x = abs(player_w - w_center)
-    else:
-        if player_w < width / 2:
-            w_center = int(width / 2) - 1
-            dist_x = abs(player_w - w_center)
-        else:
-            w_center = int(width / 2)
-            dist_x = abs(player_w - w_center)
-
-    if height % 2:
-        h_center = int(height / 2)
-        dist_y = abs(player_h - h_center)
-    else:
-        if player_h < height / 2:
-            h_center = int(height / 2) - 1
-            dist_y = abs(player_h - h_center)
-        else:
-            h_center = int(height / 2)
-            dist_y = abs(player_h - h_center)
-
-    dist = float(math.sqrt(dist_x * dist_x + dist_y * dist_y))
+    dist = center_distance(game, player)
     bonus = float(2 / (dist + 1))
-    return float(len(player_moves) - len(opponent_moves) + bonus)
+    return float(context.own_moves - context.opp_moves + bonus)
 
 
 def custom_score_2(game, player):
@@ -92,44 +171,13 @@ def custom_score_2(game, player):
     float
         The heuristic value of the current game state to the specified player.
     """
-    import math
-
-    if game.is_loser(player):
-        return float("-inf")
-    if game.is_winner(player):
-        return float("inf")
-    player_moves = game.get_legal_moves(player)
-    opponent_moves = game.get_legal_moves(game.get_opponent(player))
-
-    width = game.width
-    height = game.height
-    (player_h, player_w) = game.get_player_location(player)
+    context = game.evaluation_context(player)
+    if context.utility:
+        return context.utility
 
-    if width % 2:
-        w_center = int(width / 2)
-        dist_x = abs(player_w - w_center)
-    else:
-        if player_w < width / 2:
-            w_center = int(width / 2) - 1
-            dist_x = abs(player_w - w_center)
-        else:
-            w_center = int(width / 2)
-            dist_x = abs(player_w - w_center)
-
-    if height % 2:
-        h_center = int(height / 2)
-        dist_y = abs(player_h - h_center)
-    else:
-        if player_h < height / 2:
-            h_center = int(height / 2) - 1
-            dist_y = abs(player_h - h_center)
-        else:
-            h_center = int(height / 2)
-            dist_y = abs(player_h - h_center)
-
-    dist = float(math.sqrt(dist_x * dist_x + dist_y * dist_y))
+    dist = center_distance(game, player)
     bonus = 1 - float(2 / (dist + 1))
-    return float(len(player_moves) - len(opponent_moves) + bonus)
+    return float(context.own_moves - context.opp_moves + bonus)
 
 
 def custom_score_3(game, player):
@@ -154,44 +202,174 @@ def custom_score_3(game, player):
     float
         The heuristic value of the current game state to the specified player.
     """
-    import math
+    context = game.evaluation_context(player)
+    if context.utility:
+        return context.utility
 
-    if game.is_loser(player):
-        return float("-inf")
-    if game.is_winner(player):
-        return float("inf")
-    player_moves = game.get_legal_moves(player)
-    opponent_moves = game.get_legal_moves(game.get_opponent(player))
+    dist = center_distance(game, player)
+    bonus = 1 - float(4 / (dist + 1))
+    return float(context.own_moves - context.opp_moves + bonus)
 
-    width = game.width
-    height = game.height
-    (player_h, player_w) = game.get_player_location(player)
 
-    if width % 2:
-        w_center = int(width / 2)
-        dist_x = abs(player_w - w_center)
-    else:
-        if player_w < width / 2:
-            w_center = int(width / 2) - 1
-            dist_x = abs(player_w - w_center)
-        else:
-            w_center = int(width / 2)
-            dist_x = abs(player_w - w_center)
+# Bound types stored in transposition table entries
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
 
-    if height % 2:
-        h_center = int(height / 2)
-        dist_y = abs(player_h - h_center)
-    else:
-        if player_h < height / 2:
-            h_center = int(height / 2) - 1
-            dist_y = abs(player_h - h_center)
-        else:
-            h_center = int(height / 2)
-            dist_y = abs(player_h - h_center)
+# Width of the null window used by principal variation search
+PVS_EPSILON = 1e-6
 
-    dist = float(math.sqrt(dist_x * dist_x + dist_y * dist_y))
-    bonus = 1 - float(4 / (dist + 1))
-    return float(len(player_moves) - len(opponent_moves) + bonus)
+# Mixed into the board hash when the searching player is player 2, so that a
+# table reused across games never confuses the two perspectives
+PLAYER_2_SALT = 0x9E3779B97F4A7C15
+
+
+class TranspositionTable:
+    """Fixed-size table of search results keyed by board hash.
+
+    Each slot holds one entry (key, depth, value, bound, best_move,
+    generation); a key is mapped to slot `key % size`. When two positions
+    compete for a slot, the new entry replaces the old one if the old entry
+    was stored by an earlier search (older generation) or was searched to a
+    depth no greater than the new one, so deep results from the current
+    search are kept and stale results are recycled.
+
+    Parameters
+    ----------
+    max_bytes : int (optional)
+        Approximate memory cap for the table; the number of slots is
+        `max_bytes // ENTRY_BYTES`.
+    """
+    # Approximate size of one stored entry (tuple, key and value objects)
+    ENTRY_BYTES = 200
+
+    def __init__(self, max_bytes=16 * 2**20):
+        self.size = max(1, max_bytes // self.ENTRY_BYTES)
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._slots = [None] * self.size
+
+    def new_search(self):
+        """Age the current entries; call once before every root search."""
+        self.generation += 1
+
+    def clear(self):
+        """Remove every entry and reset the counters."""
+        self._slots = [None] * self.size
+        self.hits = self.misses = 0
+
+    def probe(self, key):
+        """Return the entry stored for key as a tuple (depth, value, bound,
+        best_move), or None if the position is not in the table.
+        """
+        entry = self._slots[key % self.size]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry[1:5]
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, value, bound, best_move):
+        """Record the result of searching a position to the given depth."""
+        idx = key % self.size
+        entry = self._slots[idx]
+        if (entry is None or entry[0] == key or depth >= entry[1] or
+                entry[5] != self.generation):
+            self._slots[idx] = (key, depth, value, bound, best_move,
+                                self.generation)
+
+    def __len__(self):
+        return sum(1 for entry in self._slots if entry is not None)
+
+
+# Statistics of the search for one move (see SearchStats)
+MoveStats = namedtuple("MoveStats", [
+    "nodes", "time_ms", "depth", "cutoffs", "first_move_cutoffs",
+    "eval_calls", "eval_ms", "extension_nodes", "quiescence_nodes"])
+
+
+class SearchStats:
+    """Per-move search statistics of a player.
+
+    Statistics are only collected while an instance is attached to the
+    `stats` attribute of a player; players leave it None by default, which
+    costs a single attribute test per move. While attached, the player's
+    score function is wrapped with a timer for the duration of each move.
+
+    Attributes
+    ----------
+    records : list<MoveStats>
+        One record per move: the number of nodes searched, the wall time of
+        the move, the depth of the deepest completed search, the number of
+        cutoffs and of cutoffs produced by the first move searched at a node,
+        the number of calls to and the time spent in the score function, and
+        the number of nodes searched below search extensions and in
+        quiescence search.
+    """
+
+    def __init__(self):
+        self.records = []
+
+    def measure(self, player, search, game, time_left):
+        """Run search(game, time_left) for the player, record its statistics
+        and return its result.
+        """
+        score_fn = player.score
+        timer = timeit.default_timer
+        evals = [0, 0.]
+
+        def timed_score(game, player):
+            start = timer()
+            try:
+                return score_fn(game, player)
+            finally:
+                evals[0] += 1
+                evals[1] += timer() - start
+
+        player.score = timed_score
+        start = timer()
+        try:
+            move = search(game, time_left)
+        finally:
+            player.score = score_fn
+        elapsed = timer() - start
+        (nodes, depth, cutoffs, first_move_cutoffs, extension_nodes,
+         quiescence_nodes) = player.search_counters()
+        self.records.append(MoveStats(nodes, 1000. * elapsed, depth, cutoffs,
+                                      first_move_cutoffs, evals[0],
+                                      1000. * evals[1], extension_nodes,
+                                      quiescence_nodes))
+        return move
+
+    def summary(self):
+        """Aggregate the records into a dict with the number of moves, the
+        total nodes, nodes per second, the mean and maximum completed depth,
+        the beta-cutoff rate (cutoffs per node that expanded its children),
+        the share of cutoffs produced by the first move searched, the share
+        of search time spent in the score function, and the shares of nodes
+        searched below extensions and in quiescence search.
+        """
+        records = self.records
+        nodes = sum(r.nodes for r in records)
+        time_ms = sum(r.time_ms for r in records)
+        cutoffs = sum(r.cutoffs for r in records)
+        interior = nodes - sum(r.eval_calls for r in records)
+        return {
+            "moves": len(records),
+            "nodes": nodes,
+            "nodes_per_second": 1000. * nodes / time_ms if time_ms else 0.,
+            "mean_depth": (sum(r.depth for r in records) / len(records)
+                           if records else 0.),
+            "max_depth": max((r.depth for r in records), default=0),
+            "cutoff_rate": cutoffs / interior if interior > 0 else 0.,
+            "first_move_cutoff_ratio": (sum(r.first_move_cutoffs for r in records) /
+                                        cutoffs if cutoffs else 0.),
+            "eval_share": (sum(r.eval_ms for r in records) / time_ms
+                           if time_ms else 0.),
+            "extension_share": (sum(r.extension_nodes for r in records) /
+                                nodes if nodes else 0.),
+            "quiescence_share": (sum(r.quiescence_nodes for r in records) /
+                                 nodes if nodes else 0.),
+        }
 
 
 class IsolationPlayer:
@@ -221,14 +399,119 @@ class IsolationPlayer:
         self.score = score_fn
         self.time_left = None
         self.TIMER_THRESHOLD = timeout
+        self.stats = None
+        # Nodes left before the next read of the clock, the number of nodes
+        # between the last two reads, and the time left at the last read
+        self._countdown = 1
+        self._check_interval = 1
+        self._last_check = None
+
+    def __getstate__(self):
+        # The timer callable of the last move is a closure over the game that
+        # was played; drop it so that players can be sent to other processes
+        state = self.__dict__.copy()
+        state["time_left"] = None
+        return state
+
+    # Upper bound on the number of nodes searched between two clock reads
+    MAX_CHECK_INTERVAL = 4096
+
+    def _start_clock(self, time_left):
+        """Install the timer of a new move; the clock is read at the next
+        node and the check interval is calibrated from there.
+        """
+        self.time_left = time_left
+        self._countdown = self._check_interval = 1
+        self._last_check = None
+
+    def _check_clock(self):
+        """Read the clock, raising SearchTimeout if the time is up, and set
+        how many nodes to search before reading it again.
+
+        Reading the clock costs a call through the time_left() closures, so
+        search nodes only count down to the next read. The interval is sized
+        from the node rate measured since the previous read so that the clock
+        is read about every TIMER_THRESHOLD / 4 milliseconds, and never less
+        often than every half of the time remaining before the threshold.
+        """
+        now = self.time_left()
+        if now < self.TIMER_THRESHOLD:
+            raise SearchTimeout()
+        interval = self._check_interval
+        elapsed = self._last_check - now if self._last_check is not None else 0.
+        if elapsed > 0:
+            target = min(self.TIMER_THRESHOLD / 4,
+                         (now - self.TIMER_THRESHOLD) / 2)
+            interval = int(interval * target / elapsed)
+        else:
+            interval *= 2
+        interval = max(1, min(interval, self.MAX_CHECK_INTERVAL))
+        self._last_check = now
+        self._countdown = self._check_interval = interval
+
+
+def root_moves(game, tie_break=None, max_placements=None):
+    """Return the legal moves of the active player in the order they should
+    be searched at the root of get_move().
+
+    Boards created with `shuffle=False` return moves in a stable order, so the
+    search (and therefore the chosen move) is reproducible. Randomness is
+    only introduced here, at the root, and only when requested: shuffling the
+    root moves makes the search pick uniformly among equally scored moves.
+
+    The first move of each player can go to any blank cell; only one move
+    per set of symmetric moves is kept then (see `placement_moves()`).
+
+    Parameters
+    ----------
+    game : `isolation.Board`
+        An instance of `isolation.Board` encoding the current state of the
+        game (e.g., player locations and blocked cells).
+
+    tie_break : random.Random (optional)
+        Random number generator used to shuffle the root moves, or None to
+        keep the board's order.
+
+    max_placements : int (optional)
+        Passed on to `placement_moves()` as the limit on the number of
+        first moves.
+
+    Returns
+    -------
+    list<(int, int)>
+        The legal moves for the active player.
+    """
+    if game.move_count < 2:
+        legal_moves = placement_moves(game, max_placements)
+    else:
+        legal_moves = game.get_legal_moves()
+    if tie_break is not None:
+        tie_break.shuffle(legal_moves)
+    return legal_moves
 
 
 class MinimaxPlayer(IsolationPlayer):
     """Game-playing agent that chooses a move using depth-limited minimax
     search. You must finish and test this player to make sure it properly uses
     minimax to return a good move before the search time limit expires.
+
+    Parameters
+    ----------
+    tie_break : random.Random (optional)
+        Random number generator used to break ties between equally scored
+        moves at the root (see `root_moves()`). If None, ties go to the first
+        move in the board's order.
+
+    See `IsolationPlayer` for the remaining parameters.
     """
 
+    def __init__(self, search_depth=3, score_fn=custom_score_2, timeout=10.,
+                 tie_break=None):
+        super().__init__(search_depth, score_fn, timeout)
+        self.tie_break = tie_break
+        self.nodes = 0
+        self.completed = False
+
     def get_move(self, game, time_left):
         """Search for the best move from the available legal moves and return a
         result before the time limit expires.
@@ -257,7 +540,23 @@ class MinimaxPlayer(IsolationPlayer):
             Board coordinates corresponding to a legal move; may return
             (-1, -1) if there are no available legal moves.
         """
-        self.time_left = time_left
+        if self.stats is not None:
+            return self.stats.measure(self, self._search_move, game, time_left)
+        return self._search_move(game, time_left)
+
+    def search_counters(self):
+        """Return (nodes, completed depth, cutoffs, first move cutoffs,
+        extension nodes, quiescence nodes) for the last call to get_move();
+        minimax search never cuts off and searches a fixed depth.
+        """
+        return (self.nodes, self.search_depth if self.completed else 0, 0, 0,
+                0, 0)
+
+    def _search_move(self, game, time_left):
+        """Implement get_move()."""
+        self._start_clock(time_left)
+        self.nodes = 0
+        self.completed = False
 
         # Initialize the best move so that this function returns something
         # in case the search fails due to timeout
@@ -266,7 +565,8 @@ class MinimaxPlayer(IsolationPlayer):
         try:
             # The try/except block will automatically catch the exception
             # raised when the timer is about to expire.
-            return self.minimax(game, self.search_depth)
+            best_move = self.minimax(game, self.search_depth)
+            self.completed = True
 
         except SearchTimeout:
             return best_move
@@ -276,6 +576,10 @@ class MinimaxPlayer(IsolationPlayer):
 
     def min_play(self, game, depth):
 
+        self.nodes += 1
+        self._countdown -= 1
+        if not self._countdown:
+            self._check_clock()
         if depth == 0:
             return self.score(game, self)
 
@@ -286,10 +590,11 @@ class MinimaxPlayer(IsolationPlayer):
         best_score = float('inf')
         best_move = legal_moves[0]
         for move in legal_moves:
-            if self.time_left() < self.TIMER_THRESHOLD:
-                raise SearchTimeout()
-            clone = game.forecast_move(move)
-            score = self.max_play(clone, depth - 1)
+            game.push_move(move)
+            try:
+                score = self.max_play(game, depth - 1)
+            finally:
+                game.pop_move()
 
             if score < best_score:
                 best_score = score
@@ -299,6 +604,10 @@ class MinimaxPlayer(IsolationPlayer):
 
     def max_play(self, game, depth):
 
+        self.nodes += 1
+        self._countdown -= 1
+        if not self._countdown:
+            self._check_clock()
         if depth == 0:
             return self.score(game, self)
 
@@ -309,10 +618,11 @@ class MinimaxPlayer(IsolationPlayer):
         best_move = legal_moves[0]
 
         for move in legal_moves:
-            if self.time_left() < self.TIMER_THRESHOLD:
-                raise SearchTimeout()
-            clone = game.forecast_move(move)
-            score = self.min_play(clone, depth - 1)
+            game.push_move(move)
+            try:
+                score = self.min_play(game, depth - 1)
+            finally:
+                game.pop_move()
 
             if score > best_score:
                 best_score = score
@@ -321,6 +631,12 @@ class MinimaxPlayer(IsolationPlayer):
         return best_score
 
     def minimax(self, game, depth):
+        """Implement depth-limited minimax search algorithm as described in
+        the lectures.
+
+        This should be a modified version of MINIMAX-DECISION in the AIMA text.
+        https://github.com/aimacode/aima-pseudocode/blob/master/md/Minimax-Decision.md
+
         Parameters
         ----------
         game : isolation.Board
@@ -348,8 +664,8 @@ class MinimaxPlayer(IsolationPlayer):
                 each helper function or else your agent will timeout during
                 testing.
         """
-
-        legal_moves = game.get_legal_moves()
+        self.nodes += 1
+        legal_moves = root_moves(game, self.tie_break)
         if len(legal_moves) == 0:
             return (-1, -1)
         best_move = legal_moves[0]
@@ -359,8 +675,11 @@ class MinimaxPlayer(IsolationPlayer):
         for move in legal_moves:
             if self.time_left() < self.TIMER_THRESHOLD:
                 raise SearchTimeout()
-            clone = game.forecast_move(move)
-            score = self.min_play(clone, depth - 1)
+            game.push_move(move)
+            try:
+                score = self.min_play(game, depth - 1)
+            finally:
+                game.pop_move()
             if score > best_score:
                 best_move = move
                 best_score = score
@@ -372,7 +691,117 @@ class AlphaBetaPlayer(IsolationPlayer):
     """Game-playing agent that chooses a move using iterative deepening minimax
     search with alpha-beta pruning. You must finish and test this player to
     make sure it returns a good move before the search time limit expires.
+
+    Parameters
+    ----------
+    tie_break : random.Random (optional)
+        Random number generator used to break ties between equally scored
+        moves at the root (see `root_moves()`). If None, ties go to the first
+        move in the board's order.
+
+    tt_bytes : int (optional)
+        Memory cap of the transposition table shared by the iterations of
+        the search and by consecutive moves; 0 disables the table.
+
+    pvs : bool (optional)
+        If True, use principal variation search: only the first move of each
+        node is searched with the full window, the others with a null window
+        that is re-searched only when it shows the move is better.
+
+    aspiration : float (optional)
+        If set, each iteration of iterative deepening after the first
+        searches the root with the window (score - aspiration, score +
+        aspiration) around the previous iteration's score, falling back to
+        a full-window search when the result lands outside it.
+
+    predict_iterations : bool (optional)
+        If True (default), iterative deepening stops as soon as the next
+        iteration is not expected to finish in time, predicting its duration
+        from the last iteration's time and node growth, instead of starting
+        a search whose result would be thrown away.
+
+    max_extensions : int (optional)
+        Maximum number of plies a single line of play can be extended by.
+        Nodes where the side to move has at most EXTENSION_MOBILITY legal
+        moves (a single reply, or a player close to being trapped) search
+        their children without using up a ply of depth. 0 disables
+        extensions.
+
+    quiescence : int (optional)
+        Maximum number of plies searched past the depth limit. Leaves where
+        the side to move has at most QUIESCENCE_MOBILITY legal moves are
+        expanded instead of scored, since the score functions misjudge
+        positions that are one or two moves away from a loss. 0 disables
+        quiescence search.
+
+    max_placements : int (optional)
+        If set, only this many of the most central cells are searched for
+        the first move of each player (see `placement_moves()`), which
+        keeps the opening searchable on large boards.
+
+    See `IsolationPlayer` for the remaining parameters.
+
+    Attributes
+    ----------
+    depth_nodes : list<int>
+        Number of nodes searched by each completed iteration of the last
+        call to get_move() (index 0 is the depth 1 search).
+
+    extensions : int
+        Number of nodes extended during the last call to get_move().
+
+    extension_nodes : int
+        Number of nodes searched below the outermost extended node of each
+        line during the last call to get_move(), an upper bound on the work
+        added by extensions.
+
+    quiescence_nodes : int
+        Number of nodes searched past the depth limit by quiescence search
+        during the last call to get_move().
+
+    root_score : float
+        The value of the best move found by the last call to alphabeta().
     """
+    # Number of killer moves remembered per ply
+    NUM_KILLERS = 2
+    # Nodes with at most this many legal moves are extended
+    EXTENSION_MOBILITY = 2
+    # Leaves with at most this many legal moves are expanded by quiescence
+    # search
+    QUIESCENCE_MOBILITY = 2
+
+    def __init__(self, search_depth=3, score_fn=custom_score_2, timeout=10.,
+                 tie_break=None, tt_bytes=16 * 2**20, pvs=False,
+                 aspiration=None, predict_iterations=True, max_extensions=0,
+                 quiescence=0, max_placements=None):
+        super().__init__(search_depth, score_fn, timeout)
+        self.tie_break = tie_break
+        self.tt = TranspositionTable(tt_bytes) if tt_bytes else None
+        self.pvs = pvs
+        self.aspiration = aspiration
+        self.predict_iterations = predict_iterations
+        self.max_extensions = max_extensions
+        self.quiescence = quiescence
+        self.max_placements = max_placements
+        self.nodes = 0
+        self.depth_nodes = []
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.extensions = 0
+        self.extension_nodes = 0
+        self.quiescence_nodes = 0
+        # Extensions granted on the line of play being searched, and the
+        # node count when the outermost of them started
+        self._extension_depth = 0
+        self._extension_start = 0
+        self._move_nodes = 0
+        self.root_score = float("-inf")
+        self._tt_salt = 0
+        self._root_ply = 0
+        # Moves that caused a cutoff, per ply below the root, and the history
+        # score of every move (deeper cutoffs weigh more)
+        self._killers = []
+        self._history = {}
 
     def get_move(self, game, time_left):
         """Search for the best move from the available legal moves and return a
@@ -404,7 +833,32 @@ class AlphaBetaPlayer(IsolationPlayer):
             Board coordinates corresponding to a legal move; may return
             (-1, -1) if there are no available legal moves.
         """
-        self.time_left = time_left
+        if self.stats is not None:
+            return self.stats.measure(self, self._search_move, game, time_left)
+        return self._search_move(game, time_left)
+
+    def search_counters(self):
+        """Return (nodes, completed depth, cutoffs, first move cutoffs,
+        extension nodes, quiescence nodes) for the last call to get_move().
+        """
+        return (self._move_nodes + self.nodes, len(self.depth_nodes),
+                self.cutoffs, self.first_move_cutoffs, self.extension_nodes,
+                self.quiescence_nodes)
+
+    def _search_move(self, game, time_left):
+        """Implement get_move() with iterative deepening."""
+        self._start_clock(time_left)
+        if self.tt is not None:
+            self.tt.new_search()
+        # Killers are only meaningful relative to this root; history scores
+        # carry over between moves but older cutoffs count for less
+        self._killers = []
+        self._history = {move: count // 2 for move, count in self._history.items()
+                         if count > 1}
+        self.depth_nodes = []
+        self.cutoffs = self.first_move_cutoffs = 0
+        self.extensions = self.extension_nodes = self.quiescence_nodes = 0
+        self._move_nodes = self.nodes = 0
 
         # Initialize the best move so that this function returns something
         # in case the search fails due to timeout
@@ -414,16 +868,61 @@ class AlphaBetaPlayer(IsolationPlayer):
             try:
                 # The try/except block will automatically catch the exception
                 # raised when the timer is about to expire.
-                best_move = self.alphabeta(game, depth)
+                self._move_nodes += self.nodes
+                self.nodes = 0
+                start = time_left()
+                best_move = self._search_root(game, depth)
+                self.depth_nodes.append(self.nodes)
                 depth += 1
 
             except SearchTimeout:
                 return best_move
 
+            if abs(self.root_score) == float("inf"):
+                # The game is decided; deeper iterations find the same result
+                break
+            if self.predict_iterations and not self._next_iteration_fits(start):
+                break
+
         # Return the best move from the last completed search iteration
         return best_move
 
-
+    def _next_iteration_fits(self, start):
+        """Predict whether the next iteration of iterative deepening can
+        finish before the timer threshold, assuming it grows over the last
+        iteration (which started with `start` ms left) as much as the last
+        iteration grew over the one before it.
+        """
+        nodes = self.depth_nodes
+        if len(nodes) < 2 or not nodes[-2]:
+            return True
+        now = self.time_left()
+        return (start - now) * nodes[-1] / nodes[-2] < now - self.TIMER_THRESHOLD
+
+    def effective_branching_factor(self):
+        """Return the branching factor achieved by the last call to get_move(),
+        i.e., the average growth in nodes searched from one completed
+        iteration to the next (the lower, the better the move ordering).
+        Returns None if fewer than two iterations completed.
+        """
+        nodes = self.depth_nodes
+        if len(nodes) < 2 or not nodes[0]:
+            return None
+        return (nodes[-1] / nodes[0]) ** (1. / (len(nodes) - 1))
+
+    def _search_root(self, game, depth):
+        """Run one iteration of iterative deepening, using an aspiration
+        window around the previous iteration's score when enabled.
+        """
+        previous = self.root_score
+        if (self.aspiration and depth > 1 and
+                float("-inf") < previous < float("inf")):
+            alpha = previous - self.aspiration
+            beta = previous + self.aspiration
+            best_move = self.alphabeta(game, depth, alpha, beta)
+            if alpha < self.root_score < beta:
+                return best_move
+        return self.alphabeta(game, depth)
 
     def alphabeta(self, game, depth, alpha=float("-inf"), beta=float("inf")):
         """Implement depth-limited minimax search with alpha-beta pruning as
@@ -470,71 +969,286 @@ class AlphaBetaPlayer(IsolationPlayer):
                 each helper function or else your agent will timeout during
                 testing.
         """
-        legal_moves = game.get_legal_moves()
+        # The root player always holds the initiative, so the parity of the
+        # move count tells which side of the board this player is on
+        self._tt_salt = PLAYER_2_SALT if game.move_count % 2 else 0
+        self._root_ply = game.move_count
+        self._extension_depth = 0
+        self.nodes += 1
+
+        legal_moves = root_moves(game, self.tie_break, self.max_placements)
         if len(legal_moves) == 0:
             return (-1, -1)
+        # The best move of the previous iteration is searched first
+        _, hash_move = self._tt_probe(game, depth, alpha, beta)
+        legal_moves = self._order_moves(legal_moves, hash_move, 0)
         best_move = legal_moves[0]
-        max_score = alpha
         best_score = alpha
-        for move in legal_moves:
+        for i, move in enumerate(legal_moves):
             if self.time_left() < self.TIMER_THRESHOLD:
                 raise SearchTimeout()
-            clone = game.forecast_move(move)
-            score = self.min_play(clone, depth - 1, best_score, beta)
+            game.push_move(move)
+            try:
+                score = self._max_child(game, depth - 1, best_score, beta,
+                                        self.pvs and i > 0)
+            finally:
+                game.pop_move()
             if score > best_score:
                 best_move = move
                 best_score = score
             if best_score >= beta:
-                return best_move
+                break
 
+        self.root_score = best_score
+        self._tt_store(game, depth, best_score, alpha, beta, best_move)
         return best_move
 
     def min_play(self, game, depth, alpha=float("-inf"), beta=float("inf")):
 
+        self.nodes += 1
+        self._countdown -= 1
+        if not self._countdown:
+            self._check_clock()
         if depth == 0:
+            if self.quiescence:
+                return self._quiesce(game, self.quiescence, alpha, beta,
+                                     False)
             return self.score(game, self)
 
-        legal_moves = game.get_legal_moves()
+        value, hash_move = self._tt_probe(game, depth, alpha, beta)
+        if value is not None:
+            return value
+
+        ply = game.move_count - self._root_ply
+        if game.move_count < 2:
+            legal_moves = placement_moves(game, self.max_placements)
+        else:
+            legal_moves = game.get_legal_moves()
+        legal_moves = self._order_moves(legal_moves, hash_move, ply)
         if len(legal_moves) == 0:
             return float("inf")
+        extended = self._extend(legal_moves)
+        child_depth = depth if extended else depth - 1
         best_score = beta
-        best_move = legal_moves[0]
-        for move in legal_moves:
-            if self.time_left() < self.TIMER_THRESHOLD:
-                raise SearchTimeout()
-            clone = game.forecast_move(move)
-            score = self.max_play(clone, depth - 1, alpha, best_score)
+        best_move = None
+        for i, move in enumerate(legal_moves):
+            game.push_move(move)
+            try:
+                score = self._min_child(game, child_depth, alpha, best_score,
+                                        self.pvs and i > 0)
+            finally:
+                game.pop_move()
             # It checks that best_score is the lowest value after every iteration.
             if score < best_score:
                 best_score = score
                 best_move = move
 
             if alpha >= best_score:
-                return best_score
+                self._record_cutoff(move, depth, ply, i)
+                break
 
+        if extended:
+            self._end_extension()
+        self._tt_store(game, depth, best_score, alpha, beta, best_move)
         return best_score
 
     def max_play(self, game, depth, alpha=float("-inf"), beta=float("inf")):
 
+        self.nodes += 1
+        self._countdown -= 1
+        if not self._countdown:
+            self._check_clock()
         if depth == 0:
+            if self.quiescence:
+                return self._quiesce(game, self.quiescence, alpha, beta,
+                                     True)
             return self.score(game, self)
 
-        legal_moves = game.get_legal_moves()
+        value, hash_move = self._tt_probe(game, depth, alpha, beta)
+        if value is not None:
+            return value
+
+        ply = game.move_count - self._root_ply
+        if game.move_count < 2:
+            legal_moves = placement_moves(game, self.max_placements)
+        else:
+            legal_moves = game.get_legal_moves()
+        legal_moves = self._order_moves(legal_moves, hash_move, ply)
         if len(legal_moves) == 0:
             return float("-inf")
+        extended = self._extend(legal_moves)
+        child_depth = depth if extended else depth - 1
         best_score = alpha
-        best_move = legal_moves[0]
-        for move in legal_moves:
-            if self.time_left() < self.TIMER_THRESHOLD:
-                raise SearchTimeout()
-            clone = game.forecast_move(move)
-            score = self.min_play(clone, depth - 1, best_score, beta)
+        best_move = None
+        for i, move in enumerate(legal_moves):
+            game.push_move(move)
+            try:
+                score = self._max_child(game, child_depth, best_score, beta,
+                                        self.pvs and i > 0)
+            finally:
+                game.pop_move()
 
             if score > best_score:
                 best_score = score
                 best_move = move
 
             if best_score >= beta:
-                return best_score
+                self._record_cutoff(move, depth, ply, i)
+                break
+
+        if extended:
+            self._end_extension()
+        self._tt_store(game, depth, best_score, alpha, beta, best_move)
+        return best_score
 
+    def _max_child(self, game, depth, alpha, beta, null_window):
+        """Search the child of a maximizing node with the window (alpha, beta).
+
+        With null_window, first test whether the child beats alpha using the
+        window (alpha, alpha + PVS_EPSILON), and only re-search with the full
+        window when it does.
+        """
+        if null_window and alpha > float("-inf"):
+            score = self.min_play(game, depth, alpha, alpha + PVS_EPSILON)
+            if not alpha < score < beta:
+                return score
+        return self.min_play(game, depth, alpha, beta)
+
+    def _min_child(self, game, depth, alpha, beta, null_window):
+        """Search the child of a minimizing node with the window (alpha, beta),
+        testing it first with the null window (beta - PVS_EPSILON, beta).
+        """
+        if null_window and beta < float("inf"):
+            score = self.max_play(game, depth, beta - PVS_EPSILON, beta)
+            if not alpha < score < beta:
+                return score
+        return self.max_play(game, depth, alpha, beta)
+
+    def _extend(self, legal_moves):
+        """Return True if a node with these legal moves should search its
+        children at its own depth, i.e., the side to move has at most
+        EXTENSION_MOBILITY moves and the line of play has not been extended
+        max_extensions times yet. Every extension must be closed with
+        _end_extension() once the children are searched.
+        """
+        if (len(legal_moves) > self.EXTENSION_MOBILITY or
+                self._extension_depth >= self.max_extensions):
+            return False
+        if not self._extension_depth:
+            self._extension_start = self.nodes
+        self._extension_depth += 1
+        self.extensions += 1
+        return True
+
+    def _end_extension(self):
+        """Close an extension opened by _extend(), counting the nodes
+        searched below the outermost extension of the line.
+        """
+        self._extension_depth -= 1
+        if not self._extension_depth:
+            self.extension_nodes += self.nodes - self._extension_start
+
+    def _quiesce(self, game, plies, alpha, beta, maximizing):
+        """Score a leaf of the search, first searching up to `plies` more
+        plies as long as the side to move has at most QUIESCENCE_MOBILITY
+        legal moves.
+
+        Only a handful of moves are available in such positions, so the
+        search stays small, and it resolves the forced sequences that the
+        score functions cannot see, e.g. a player walking into a dead end.
+        """
+        legal_moves = game.get_legal_moves()
+        if (not plies or not legal_moves or
+                len(legal_moves) > self.QUIESCENCE_MOBILITY):
+            return self.score(game, self)
+        best_score = float("-inf") if maximizing else float("inf")
+        for move in legal_moves:
+            self.nodes += 1
+            self.quiescence_nodes += 1
+            self._countdown -= 1
+            if not self._countdown:
+                self._check_clock()
+            game.push_move(move)
+            try:
+                score = self._quiesce(game, plies - 1, alpha, beta,
+                                      not maximizing)
+            finally:
+                game.pop_move()
+            if maximizing:
+                best_score = max(best_score, score)
+                alpha = max(alpha, best_score)
+            else:
+                best_score = min(best_score, score)
+                beta = min(beta, best_score)
+            if alpha >= beta:
+                break
         return best_score
+
+    def _order_moves(self, legal_moves, hash_move, ply):
+        """Sort moves for search: the transposition table (principal
+        variation) move first, then the killer moves of this ply, then the
+        remaining moves by decreasing history score.
+        """
+        history = self._history
+        if history:
+            legal_moves.sort(key=lambda move: history.get(move, 0), reverse=True)
+        if ply < len(self._killers):
+            for killer in reversed(self._killers[ply]):
+                if killer in legal_moves:
+                    legal_moves.remove(killer)
+                    legal_moves.insert(0, killer)
+        if hash_move is not None and hash_move in legal_moves:
+            legal_moves.remove(hash_move)
+            legal_moves.insert(0, hash_move)
+        return legal_moves
+
+    def _record_cutoff(self, move, depth, ply, index):
+        """Update the killer moves and history scores after `move`, the
+        index-th move searched at its node, produced a cutoff with `depth`
+        plies left to search.
+        """
+        self.cutoffs += 1
+        if not index:
+            self.first_move_cutoffs += 1
+        while len(self._killers) <= ply:
+            self._killers.append([])
+        killers = self._killers[ply]
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[self.NUM_KILLERS:]
+        self._history[move] = self._history.get(move, 0) + depth * depth
+
+    def _tt_probe(self, game, depth, alpha, beta):
+        """Look the position up in the transposition table.
+
+        Returns a pair (value, hash_move): value is the stored value if the
+        position was searched at least as deep and the stored bound decides
+        the (alpha, beta) window, otherwise None; hash_move is the best move
+        found by the previous search of the position, or None.
+        """
+        if self.tt is None:
+            return None, None
+        entry = self.tt.probe(game.hash() ^ self._tt_salt)
+        if entry is None:
+            return None, None
+        entry_depth, value, bound, hash_move = entry
+        if entry_depth >= depth and (
+                bound == EXACT or (bound == LOWER_BOUND and value >= beta) or
+                (bound == UPPER_BOUND and value <= alpha)):
+            return value, hash_move
+        return None, hash_move
+
+    def _tt_store(self, game, depth, value, alpha, beta, best_move):
+        """Record a search result, classifying it against the window that
+        produced it.
+        """
+        if self.tt is None:
+            return
+        if value <= alpha:
+            bound = UPPER_BOUND
+        elif value >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        self.tt.store(game.hash() ^ self._tt_salt, depth, value, bound,
+                      best_move)
@@ -0,0 +1,255 @@
+"""Fit the weights of a linear evaluation function to recorded game results.
+
+`PositionDataset` collects the positions of finished games together with
+their results and stores them in a compact binary file (12 bytes per
+position). `fit()` trains a logistic regression that predicts the result of
+a position from the features returned by `features()`, and returns a
+`LinearScore`: a score function that can be passed to any player as
+`score_fn` and saved to and loaded from a small JSON file.
+
+Record positions from tournament games, fit, and rate the tuned heuristic::
+
+    python tournament.py --positions positions.bin
+    python heuristic_tuning.py positions.bin --output weights.json
+    python tournament.py --weights weights.json
+
+The fit needs NumPy; scoring with a fitted LinearScore does not.
+"""
+import argparse
+import json
+import os
+import struct
+
+from isolation import Board
+from game_agent import center_distance
+
+# Names of the values returned by features()
+FEATURES = ("own_moves", "opp_moves", "own_center", "opp_center",
+            "initiative")
+
+_HEADER = struct.Struct("<4sBBxxI")
+_RECORD = struct.Struct("<QBBBb")
+_MAGIC = b"ISOD"
+# Stored in place of the location of a player that has not moved
+_NO_LOCATION = 255
+
+
+def features(game, player):
+    """Return the feature vector of a non-terminal position from the point
+    of view of player: the number of legal moves of the player and of its
+    opponent, their distances to the board center, and +1 if the player is
+    the one to move (-1 otherwise).
+    """
+    context = game.evaluation_context(player)
+    opponent = game.get_opponent(player)
+    return (context.own_moves, context.opp_moves,
+            center_distance(game, player), center_distance(game, opponent),
+            1 if player == game.active_player else -1)
+
+
+class LinearScore:
+    """Heuristic that scores non-terminal positions with a weighted sum of
+    the features returned by `features()`.
+
+    Instances are plain picklable objects, so they can be used as the
+    `score_fn` of players sent to tournament worker processes.
+
+    Parameters
+    ----------
+    weights : sequence of float
+        One weight per entry of FEATURES.
+    """
+
+    def __init__(self, weights):
+        if len(weights) != len(FEATURES):
+            raise ValueError("Expected {} weights, got {}".format(
+                len(FEATURES), len(weights)))
+        self.weights = tuple(float(w) for w in weights)
+
+    def __call__(self, game, player):
+        context = game.evaluation_context(player)
+        if context.utility:
+            return context.utility
+        return sum(w * f for w, f in zip(self.weights, features(game, player)))
+
+    def __repr__(self):
+        return "LinearScore({!r})".format(self.weights)
+
+    def save(self, path):
+        """Write the weights to a JSON file."""
+        with open(path, "w") as f:
+            json.dump(dict(zip(FEATURES, self.weights)), f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        """Read weights written by save()."""
+        with open(path) as f:
+            weights = json.load(f)
+        return cls([weights[name] for name in FEATURES])
+
+
+class _Player:
+    """Placeholder player registered on the boards built from records."""
+
+
+class PositionDataset:
+    """Positions of finished games labeled with the game result.
+
+    Each record holds the blocked cells as a bit mask, the cell of each
+    player, the move count and +1 if the player to move went on to win (-1
+    otherwise), so boards are limited to 64 cells.
+
+    Parameters
+    ----------
+    width, height : int (optional)
+        The size of the boards the positions were played on.
+    """
+
+    def __init__(self, width=7, height=7):
+        if width * height > 64:
+            raise ValueError("PositionDataset supports boards of up to 64 cells")
+        self.width = width
+        self.height = height
+        self.records = []
+
+    def __len__(self):
+        return len(self.records)
+
+    def add_game(self, moves, winner):
+        """Record every position of a finished game.
+
+        Parameters
+        ----------
+        moves : list<(int, int)>
+            All moves of the game from the empty board, e.g. the opening
+            moves followed by the history returned by Board.play().
+
+        winner : int
+            The index of the winner (0 for player 1, 1 for player 2).
+        """
+        blocked = 0
+        locations = [_NO_LOCATION, _NO_LOCATION]
+        for move_count in range(len(moves) + 1):
+            side = move_count % 2
+            if _NO_LOCATION not in locations:
+                self.records.append((blocked, locations[0], locations[1],
+                                     move_count, 1 if side == winner else -1))
+            if move_count < len(moves):
+                row, col = moves[move_count]
+                idx = row + col * self.height
+                blocked |= 1 << idx
+                locations[side] = idx
+
+    def boards(self):
+        """Yield (game, result) for every record, where game is a Board in
+        the recorded position and result is +1 if its active player won.
+        """
+        for blocked, p1_loc, p2_loc, move_count, result in self.records:
+            state = {"width": self.width, "height": self.height,
+                     "move_count": move_count,
+                     "blocked": [idx for idx in range(self.width * self.height)
+                                 if blocked >> idx & 1],
+                     "locations": [p1_loc, p2_loc]}
+            yield Board.from_state(_Player(), _Player(), state,
+                                   shuffle=False), result
+
+    def save(self, path, append=False):
+        """Write the dataset to a file, or add its records to an existing
+        dataset file if append is True.
+        """
+        records = self.records
+        if append and os.path.exists(path):
+            existing = PositionDataset.load(path)
+            if (existing.width, existing.height) != (self.width, self.height):
+                raise ValueError("{} holds positions of another board size"
+                                 .format(path))
+            records = existing.records + records
+        with open(path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, self.width, self.height, len(records)))
+            for record in records:
+                f.write(_RECORD.pack(*record))
+
+    @classmethod
+    def load(cls, path):
+        """Read a dataset written by save()."""
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, width, height, count = _HEADER.unpack_from(data)
+        if magic != _MAGIC:
+            raise ValueError("{} is not a position dataset".format(path))
+        dataset = cls(width, height)
+        dataset.records = list(_RECORD.iter_unpack(data[_HEADER.size:]))
+        if len(dataset.records) != count:
+            raise ValueError("{} is truncated".format(path))
+        return dataset
+
+
+def fit(dataset, l2=1e-3, iterations=25):
+    """Fit the weights of a LinearScore to a dataset with L2-regularized
+    logistic regression (Newton's method).
+
+    Terminal positions are skipped because score functions never evaluate
+    them. Every position is used from the point of view of both players
+    (with the result negated for the player not to move), so the fitted
+    score is antisymmetric.
+
+    Returns
+    -------
+    (LinearScore, dict)
+        The fitted score function, and a dict with the number of positions
+        used, the training "log_loss" and the "accuracy" of the sign of the
+        score as a predictor of the result.
+    """
+    import numpy as np
+
+    rows, labels = [], []
+    for game, result in dataset.boards():
+        if game.utility(game.active_player):
+            continue
+        for player, label in ((game.active_player, result),
+                              (game.inactive_player, -result)):
+            rows.append(features(game, player))
+            labels.append(label > 0)
+    if not rows:
+        raise ValueError("The dataset has no non-terminal positions")
+    x = np.array(rows, dtype=float)
+    y = np.array(labels, dtype=float)
+
+    weights = np.zeros(x.shape[1])
+    for _ in range(iterations):
+        p = 1 / (1 + np.exp(-x @ weights))
+        gradient = x.T @ (y - p) - l2 * weights
+        hessian = (x.T * (p * (1 - p))) @ x + l2 * np.eye(len(weights))
+        step = np.linalg.solve(hessian, gradient)
+        weights += step
+        if np.abs(step).max() < 1e-9:
+            break
+
+    p = np.clip(1 / (1 + np.exp(-x @ weights)), 1e-12, 1 - 1e-12)
+    report = {
+        "positions": len(rows) // 2,
+        "log_loss": float(-np.mean(y * np.log(p) + (1 - y) * np.log(1 - p))),
+        "accuracy": float(np.mean((x @ weights > 0) == (y > 0))),
+    }
+    return LinearScore(weights.tolist()), report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("dataset", help="position dataset file to fit")
+    parser.add_argument("--output", default="weights.json",
+                        help="file to write the fitted weights to")
+    parser.add_argument("--l2", type=float, default=1e-3,
+                        help="L2 regularization strength")
+    args = parser.parse_args()
+
+    score_fn, report = fit(PositionDataset.load(args.dataset), args.l2)
+    score_fn.save(args.output)
+    print("Fitted {} positions: log loss {:.4f}, accuracy {:.3f}".format(
+        report["positions"], report["log_loss"], report["accuracy"]))
+    for name, weight in zip(FEATURES, score_fn.weights):
+        print("{:>12} {:+.4f}".format(name, weight))
+
+
+if __name__ == "__main__":
+    main()
@@ -8,4 +8,8 @@ legal moves loses, and the opponent is declared the winner.
 """
 
 # Make the Board class available at the root of the module for imports
-from .isolation import Board
+from .isolation import (Board, EvaluationContext, GameRecord, Symmetry,
+                        board_symmetries, knight_neighbors, zobrist_keys)
+from .bitboard import BitBoard
+from .compact import CompactBoard
+from .records import GameRecordWriter, positions, read_records, replay
@@ -0,0 +1,380 @@
+"""
+This file contains the `BitBoard` class, an alternate engine for the game
+Isolation that stores the board as integer bit masks instead of a list of
+cells.
+
+Cell `i` of the board maps to bit `i` of the masks, using the same indexing
+as `isolation.Board` (idx = row + column * height).  The set of knight moves
+reachable from every cell is precomputed once per board geometry, so legal
+move generation reduces to a single AND-NOT of two integers followed by a
+scan of the set bits.
+
+`BitBoard` is a drop-in replacement for `Board`: it subclasses `Board` and
+keeps every public method signature, so players and search code written
+against `Board` run unchanged.
+"""
+import random
+
+from .isolation import (Board, _cache_tables, _state_hash, knight_neighbors,
+                        zobrist_keys)
+
+# Precomputed tables shared by every BitBoard instance with the same
+# (width, height), built lazily the first time a geometry is used.
+_GEOMETRY_CACHE = {}
+
+# Maximum number of move lists memoized per geometry; there are up to 256
+# per cell, so the memo is cleared when it grows past this on large boards
+MAX_MOVE_LISTS = 2**16
+
+
+def _geometry(width, height):
+    """Return the (knight_masks, cells, full_mask, move_lists) tables for a
+    board size.
+
+    knight_masks[i] is the bit mask of cells a knight can reach from cell i,
+    cells[i] is the (row, column) coordinate pair of cell i, full_mask has
+    one bit set for every cell on the board, and move_lists is a dict that
+    memoizes the tuple of coordinate pairs for each mask of legal moves
+    or blank cells.
+    """
+    key = (width, height)
+    tables = _GEOMETRY_CACHE.get(key)
+    if tables is None:
+        neighbors, cells = knight_neighbors(width, height)
+        masks = tuple(sum(1 << n for n in adjacent) for adjacent in neighbors)
+        tables = (masks, cells, (1 << (width * height)) - 1, {})
+        _cache_tables(_GEOMETRY_CACHE, key, tables)
+    return tables
+
+
+class BitBoard(Board):
+    """Implement a model for the game Isolation assuming each player moves like
+    a knight in chess, using integer bit masks to store the board state.
+
+    Parameters
+    ----------
+    player_1 : object
+        An object with a get_move() function. This is the only function
+        directly called by the Board class for each player.
+
+    player_2 : object
+        An object with a get_move() function. This is the only function
+        directly called by the Board class for each player.
+
+    width : int (optional)
+        The number of columns that the board should have.
+
+    height : int (optional)
+        The number of rows that the board should have.
+
+    shuffle : bool (optional)
+        If True (default), get_legal_moves() returns the moves of a placed
+        player in random order. If False, moves are always returned in the
+        same stable order.
+    """
+
+    def __init__(self, player_1, player_2, width=7, height=7, shuffle=True):
+        self.width = width
+        self.height = height
+        self.shuffle = shuffle
+        self.move_count = 0
+        self._player_1 = player_1
+        self._player_2 = player_2
+        self._active_player = player_1
+        self._inactive_player = player_2
+
+        (self._masks, self._cells, self._full_mask,
+         self._move_lists) = _geometry(width, height)
+        # Bit mask of every cell that has been occupied, and the cell index
+        # of the last move of each player (NOT_MOVED before the first move)
+        self._blocked = 0
+        self._p1_loc = Board.NOT_MOVED
+        self._p2_loc = Board.NOT_MOVED
+        self._zobrist_keys = zobrist_keys(width, height)
+        self._zobrist = 0
+        self._undo_stack = []
+
+    @property
+    def _board_state(self):
+        """Expand the bit masks into the list layout used by `Board`. This is
+        only used by the slow, non-search methods inherited from `Board`
+        (e.g., `to_string()`).
+        """
+        state = [Board.BLANK] * (self.width * self.height + 3)
+        for idx in self._iter_bits(self._blocked):
+            state[idx] = 1
+        state[-1] = self._p1_loc
+        state[-2] = self._p2_loc
+        state[-3] = self.move_count & 1
+        return state
+
+    def hash(self):
+        """Return the 64-bit Zobrist key of the current state; BitBoard and
+        Board produce the same key for the same position.
+        """
+        return self._zobrist
+
+    def copy(self):
+        """ Return a deep copy of the current board. """
+        new_board = BitBoard.__new__(BitBoard)
+        new_board.width = self.width
+        new_board.height = self.height
+        new_board.shuffle = self.shuffle
+        new_board.move_count = self.move_count
+        new_board._player_1 = self._player_1
+        new_board._player_2 = self._player_2
+        new_board._active_player = self._active_player
+        new_board._inactive_player = self._inactive_player
+        new_board._masks = self._masks
+        new_board._cells = self._cells
+        new_board._full_mask = self._full_mask
+        new_board._move_lists = self._move_lists
+        new_board._blocked = self._blocked
+        new_board._p1_loc = self._p1_loc
+        new_board._p2_loc = self._p2_loc
+        new_board._zobrist_keys = self._zobrist_keys
+        new_board._zobrist = self._zobrist
+        new_board._undo_stack = []
+        return new_board
+
+    def get_state(self):
+        """Return a snapshot of the game state that does not reference the
+        player objects (see `Board.get_state()`).
+        """
+        return {"width": self.width, "height": self.height,
+                "move_count": self.move_count,
+                "blocked": list(self._iter_bits(self._blocked)),
+                "locations": [self._p1_loc, self._p2_loc]}
+
+    def _load_state(self, blocked, locations, move_count):
+        """Overwrite the state of a freshly constructed board."""
+        for idx in blocked:
+            self._blocked |= 1 << idx
+        self._p1_loc, self._p2_loc = locations
+        self.move_count = move_count
+        if move_count % 2:
+            self._active_player, self._inactive_player = self._player_2, self._player_1
+        self._zobrist = _state_hash(self._zobrist_keys, blocked, locations,
+                                    move_count)
+
+    def move_is_legal(self, move):
+        """Test whether a move is legal in the current game state.
+
+        Parameters
+        ----------
+        move : (int, int)
+            A coordinate pair (row, column) indicating the next position for
+            the active player on the board.
+
+        Returns
+        -------
+        bool
+            Returns True if the move is legal, False otherwise
+        """
+        return (0 <= move[0] < self.height and 0 <= move[1] < self.width and
+                not self._blocked >> (move[0] + move[1] * self.height) & 1)
+
+    def get_blank_spaces(self):
+        """Return a list of the locations that are still available on the board.
+        """
+        if not self._blocked:
+            return list(self._cells)
+        return list(self._mask_cells(self._full_mask & ~self._blocked))
+
+    def get_player_location(self, player):
+        """Find the current location of the specified player on the board.
+
+        Parameters
+        ----------
+        player : object
+            An object registered as a player in the current game.
+
+        Returns
+        -------
+        (int, int) or None
+            The coordinate pair (row, column) of the input player, or None
+            if the player has not moved.
+        """
+        idx = self._location_index(player)
+        if idx is Board.NOT_MOVED:
+            return Board.NOT_MOVED
+        return self._cells[idx]
+
+    def get_legal_moves(self, player=None):
+        """Return the list of all legal moves for the specified player.
+
+        Parameters
+        ----------
+        player : object (optional)
+            An object registered as a player in the current game. If None,
+            return the legal moves for the active player on the board.
+
+        Returns
+        -------
+        list<(int, int)>
+            The list of coordinate pairs (row, column) of all legal moves
+            for the player constrained by the current game state.
+        """
+        if player is None:
+            player = self._active_player
+        idx = self._location_index(player)
+        if idx is Board.NOT_MOVED:
+            return self.get_blank_spaces()
+        valid_moves = list(self._mask_cells(self._masks[idx] & ~self._blocked))
+        if self.shuffle:
+            random.shuffle(valid_moves)
+        return valid_moves
+
+    def _mask_cells(self, mask):
+        """Return the tuple of coordinate pairs of the cells in a mask,
+        memoized per mask for every board of the same geometry.
+        """
+        moves = self._move_lists.get(mask)
+        if moves is None:
+            cells = self._cells
+            moves = tuple(cells[i] for i in self._iter_bits(mask))
+            if len(self._move_lists) >= MAX_MOVE_LISTS:
+                self._move_lists.clear()
+            self._move_lists[mask] = moves
+        return moves
+
+    def mobility(self, player=None):
+        """Return the number of legal moves for the specified player.
+
+        Parameters
+        ----------
+        player : object (optional)
+            An object registered as a player in the current game. If None,
+            count the legal moves for the active player on the board.
+
+        Returns
+        -------
+        int
+            The number of legal moves for the player.
+        """
+        if player is None:
+            player = self._active_player
+        idx = self._location_index(player)
+        if idx is Board.NOT_MOVED:
+            return bin(self._full_mask & ~self._blocked).count("1")
+        return bin(self._masks[idx] & ~self._blocked).count("1")
+
+    def apply_move(self, move):
+        """Move the active player to a specified location.
+
+        Parameters
+        ----------
+        move : (int, int)
+            A coordinate pair (row, column) indicating the next position for
+            the active player on the board.
+        """
+        idx = move[0] + move[1] * self.height
+        cell_keys, location_keys, side_key = self._zobrist_keys
+        key = self._zobrist ^ cell_keys[idx] ^ side_key
+        if self._active_player == self._player_2:
+            location_keys = location_keys[1]
+            if self._p2_loc is not Board.NOT_MOVED:
+                key ^= location_keys[self._p2_loc]
+            self._p2_loc = idx
+        else:
+            location_keys = location_keys[0]
+            if self._p1_loc is not Board.NOT_MOVED:
+                key ^= location_keys[self._p1_loc]
+            self._p1_loc = idx
+        self._zobrist = key ^ location_keys[idx]
+        self._blocked |= 1 << idx
+        self._active_player, self._inactive_player = self._inactive_player, self._active_player
+        self.move_count += 1
+
+    def push_move(self, move):
+        """Move the active player to a specified location in-place, recording
+        the information needed to take the move back with pop_move().
+
+        Parameters
+        ----------
+        move : (int, int)
+            A coordinate pair (row, column) indicating the next position for
+            the active player on the board.
+        """
+        self._undo_stack.append((self._blocked, self._p1_loc, self._p2_loc,
+                                 self._zobrist))
+        self.apply_move(move)
+
+    def pop_move(self):
+        """Undo the most recent move applied with push_move(), restoring the
+        board to the exact state it had before that move.
+        """
+        (self._blocked, self._p1_loc, self._p2_loc,
+         self._zobrist) = self._undo_stack.pop()
+        self._active_player, self._inactive_player = self._inactive_player, self._active_player
+        self.move_count -= 1
+
+    def is_winner(self, player):
+        """ Test whether the specified player has won the game. """
+        return player == self._inactive_player and not self._has_moves()
+
+    def is_loser(self, player):
+        """ Test whether the specified player has lost the game. """
+        return player == self._active_player and not self._has_moves()
+
+    def utility(self, player):
+        """Returns the utility of the current game state from the perspective
+        of the specified player.
+
+                    /  +infinity,   "player" wins
+        utility =  |   -infinity,   "player" loses
+                    \\          0,    otherwise
+
+        Parameters
+        ----------
+        player : object (optional)
+            An object registered as a player in the current game. If None,
+            return the utility for the active player on the board.
+
+        Returns
+        ----------
+        float
+            The utility value of the current game state for the specified
+            player. The game has a utility of +inf if the player has won,
+            a value of -inf if the player has lost, and a value of 0
+            otherwise.
+        """
+        if not self._has_moves():
+
+            if player == self._inactive_player:
+                return float("inf")
+
+            if player == self._active_player:
+                return float("-inf")
+
+        return 0.
+
+    def _locations(self):
+        """Return the cell indices of player 1 and player 2."""
+        return self._p1_loc, self._p2_loc
+
+    def _location_index(self, player):
+        """Return the cell index of the player, or NOT_MOVED."""
+        if player == self._player_1:
+            return self._p1_loc
+        elif player == self._player_2:
+            return self._p2_loc
+        raise RuntimeError(
+            "Invalid player in get_player_location: {}".format(player))
+
+    def _has_moves(self):
+        """Test whether the active player has any legal move without building
+        the move list.
+        """
+        idx = self._p2_loc if self._active_player == self._player_2 else self._p1_loc
+        if idx is Board.NOT_MOVED:
+            return self._blocked != self._full_mask
+        return bool(self._masks[idx] & ~self._blocked)
+
+    @staticmethod
+    def _iter_bits(mask):
+        """Yield the index of every set bit in the mask, lowest first."""
+        while mask:
+            low = mask & -mask
+            yield low.bit_length() - 1
+            mask ^= low
@@ -0,0 +1,188 @@
+"""
+This file contains the `CompactBoard` class, a variant of `isolation.Board`
+that keeps the cells of the board in a `bytearray` (one byte per cell, set
+once the cell is blocked) and the player locations in separate slots.
+
+`CompactBoard` declares a slot for every attribute it uses, so they are
+stored in the instance rather than in its `__dict__`. `Board` itself has no
+`__slots__`, so instances still have a `__dict__`, which stays empty unless
+other code sets attributes of its own on a board. copy() duplicates the
+cell buffer in a single C-level copy without calling `__init__`. This makes
+forecast_move() cheaper for players that search by copying the board (e.g.
+`GreedyPlayer` in `sample_players.py`), while move generation and the
+heuristics run the inherited `Board` code unchanged.
+
+`CompactBoard` is a drop-in replacement for `Board`: it subclasses `Board`
+and keeps every public method signature.
+"""
+from .isolation import Board, _state_hash, knight_neighbors, zobrist_keys
+
+
+class CompactBoard(Board):
+    """Isolation board that stores its cells in a bytearray and its
+    attributes in slots (see the module docstring).
+
+    Parameters
+    ----------
+    player_1 : object
+        An object with a get_move() function. This is the only function
+        directly called by the Board class for each player.
+
+    player_2 : object
+        An object with a get_move() function. This is the only function
+        directly called by the Board class for each player.
+
+    width : int (optional)
+        The number of columns that the board should have.
+
+    height : int (optional)
+        The number of rows that the board should have.
+
+    shuffle : bool (optional)
+        If True (default), get_legal_moves() returns the moves of a placed
+        player in random order. If False, moves are always returned in the
+        same stable order.
+    """
+
+    __slots__ = ("width", "height", "shuffle", "move_count", "_player_1",
+                 "_player_2", "_active_player", "_inactive_player",
+                 "_neighbors", "_cells", "_zobrist_keys", "_zobrist",
+                 "_board_state", "_blocked_cells", "_p1_loc", "_p2_loc",
+                 "_undo_stack")
+
+    def __init__(self, player_1, player_2, width=7, height=7, shuffle=True):
+        self.width = width
+        self.height = height
+        self.shuffle = shuffle
+        self.move_count = 0
+        self._player_1 = player_1
+        self._player_2 = player_2
+        self._active_player = player_1
+        self._inactive_player = player_2
+        self._neighbors, self._cells = knight_neighbors(width, height)
+        self._zobrist_keys = zobrist_keys(width, height)
+        self._zobrist = 0
+
+        # Unlike Board, the state only holds the cells; the player locations
+        # live in their own slots and the initiative follows from move_count
+        self._board_state = bytearray(width * height)
+        self._blocked_cells = []
+        self._p1_loc = Board.NOT_MOVED
+        self._p2_loc = Board.NOT_MOVED
+        self._undo_stack = []
+
+    def copy(self):
+        """ Return a deep copy of the current board. """
+        new_board = CompactBoard.__new__(CompactBoard)
+        new_board.width = self.width
+        new_board.height = self.height
+        new_board.shuffle = self.shuffle
+        new_board.move_count = self.move_count
+        new_board._player_1 = self._player_1
+        new_board._player_2 = self._player_2
+        new_board._active_player = self._active_player
+        new_board._inactive_player = self._inactive_player
+        new_board._neighbors = self._neighbors
+        new_board._cells = self._cells
+        new_board._zobrist_keys = self._zobrist_keys
+        new_board._zobrist = self._zobrist
+        new_board._board_state = self._board_state[:]
+        new_board._blocked_cells = self._blocked_cells[:]
+        new_board._p1_loc = self._p1_loc
+        new_board._p2_loc = self._p2_loc
+        new_board._undo_stack = []
+        return new_board
+
+    def _load_state(self, blocked, locations, move_count):
+        """Overwrite the state of a freshly constructed board."""
+        for idx in blocked:
+            self._board_state[idx] = 1
+        self._blocked_cells = list(blocked)
+        self._p1_loc, self._p2_loc = locations
+        self.move_count = move_count
+        if move_count % 2:
+            self._active_player, self._inactive_player = self._player_2, self._player_1
+        self._zobrist = _state_hash(self._zobrist_keys, blocked, locations,
+                                    move_count)
+
+    def get_player_location(self, player):
+        """Find the current location of the specified player on the board.
+
+        Parameters
+        ----------
+        player : object
+            An object registered as a player in the current game.
+
+        Returns
+        -------
+        (int, int) or None
+            The coordinate pair (row, column) of the input player, or None
+            if the player has not moved.
+        """
+        idx = self._location_index(player)
+        if idx is Board.NOT_MOVED:
+            return Board.NOT_MOVED
+        return self._cells[idx]
+
+    def apply_move(self, move):
+        """Move the active player to a specified location.
+
+        Parameters
+        ----------
+        move : (int, int)
+            A coordinate pair (row, column) indicating the next position for
+            the active player on the board.
+        """
+        idx = move[0] + move[1] * self.height
+        cell_keys, location_keys, side_key = self._zobrist_keys
+        key = self._zobrist ^ cell_keys[idx] ^ side_key
+        if self._active_player == self._player_2:
+            location_keys = location_keys[1]
+            if self._p2_loc is not Board.NOT_MOVED:
+                key ^= location_keys[self._p2_loc]
+            self._p2_loc = idx
+        else:
+            location_keys = location_keys[0]
+            if self._p1_loc is not Board.NOT_MOVED:
+                key ^= location_keys[self._p1_loc]
+            self._p1_loc = idx
+        self._zobrist = key ^ location_keys[idx]
+        self._board_state[idx] = 1
+        self._blocked_cells.append(idx)
+        self._active_player, self._inactive_player = self._inactive_player, self._active_player
+        self.move_count += 1
+
+    def push_move(self, move):
+        """Move the active player to a specified location in-place, recording
+        the information needed to take the move back with pop_move().
+
+        Parameters
+        ----------
+        move : (int, int)
+            A coordinate pair (row, column) indicating the next position for
+            the active player on the board.
+        """
+        self._undo_stack.append((self._p1_loc, self._p2_loc, self._zobrist))
+        self.apply_move(move)
+
+    def pop_move(self):
+        """Undo the most recent move applied with push_move(), restoring the
+        board to the exact state it had before that move.
+        """
+        self._p1_loc, self._p2_loc, self._zobrist = self._undo_stack.pop()
+        self._board_state[self._blocked_cells.pop()] = Board.BLANK
+        self._active_player, self._inactive_player = self._inactive_player, self._active_player
+        self.move_count -= 1
+
+    def _locations(self):
+        """Return the cell indices of player 1 and player 2."""
+        return self._p1_loc, self._p2_loc
+
+    def _location_index(self, player):
+        """Return the cell index of the player, or NOT_MOVED."""
+        if player == self._player_1:
+            return self._p1_loc
+        elif player == self._player_2:
+            return self._p2_loc
+        raise RuntimeError(
+            "Invalid player in get_player_location: {}".format(player))
@@ -9,10 +9,206 @@ be available to project reviewers.
 """
 import random
 import timeit
+from collections import namedtuple
 from copy import copy
 
 TIME_LIMIT_MILLIS = 150
 
+# Mobility of both players and the utility of a state, computed once per node
+# by Board.evaluation_context() and shared by terminal tests and heuristics
+EvaluationContext = namedtuple("EvaluationContext",
+                               ["own_moves", "opp_moves", "utility"])
+
+# Record of a game played with Board.play(): the get_state() snapshot of the
+# starting position, the moves played, the milliseconds used by every call
+# to get_move() (one more than the moves, as the last call is the losing
+# one), the index of the winner (0 for player 1, 1 for player 2), the
+# termination reason, and optional names of the two players
+GameRecord = namedtuple("GameRecord", ["state", "moves", "times", "winner",
+                                       "termination", "players"])
+
+_KNIGHT_OFFSETS = [(-2, -1), (-2, 1), (-1, -2), (-1, 2),
+                   (1, -2), (1, 2), (2, -1), (2, 1)]
+
+# Number of board geometries whose tables are kept by each of the caches
+# below; the tables of the least recently built geometry are dropped first
+# (boards keep references to the tables they use, so they are unaffected)
+MAX_CACHED_GEOMETRIES = 8
+
+
+def _cache_tables(cache, key, tables):
+    """Store the tables of a geometry in a cache, evicting the oldest entry
+    when it holds MAX_CACHED_GEOMETRIES geometries.
+    """
+    if len(cache) >= MAX_CACHED_GEOMETRIES:
+        del cache[next(iter(cache))]
+    cache[key] = tables
+
+
+# Neighbor tables shared by every board with the same (width, height), built
+# lazily the first time a geometry is used.
+_NEIGHBOR_TABLES = {}
+
+
+def knight_neighbors(width, height):
+    """Return the knight-move adjacency table for a board geometry.
+
+    The table is built once per (width, height) and shared by every board of
+    that size.
+
+    Parameters
+    ----------
+    width : int
+        The number of columns of the board.
+
+    height : int
+        The number of rows of the board.
+
+    Returns
+    -------
+    (tuple<tuple<int>>, tuple<(int, int)>)
+        A pair (neighbors, cells) where neighbors[i] holds the flat index
+        (row + column * height) of every cell a knight can reach from cell i,
+        and cells[i] is the (row, column) coordinate pair of cell i.
+    """
+    key = (width, height)
+    tables = _NEIGHBOR_TABLES.get(key)
+    if tables is None:
+        cells = tuple((idx % height, idx // height)
+                      for idx in range(width * height))
+        neighbors = tuple(
+            tuple(r + dr + (c + dc) * height for dr, dc in _KNIGHT_OFFSETS
+                  if 0 <= r + dr < height and 0 <= c + dc < width)
+            for r, c in cells)
+        tables = (neighbors, cells)
+        _cache_tables(_NEIGHBOR_TABLES, key, tables)
+    return tables
+
+
+# Zobrist key tables shared by every board with the same (width, height)
+_ZOBRIST_TABLES = {}
+
+
+def zobrist_keys(width, height):
+    """Return the random 64-bit keys used for Zobrist hashing on a board
+    geometry.
+
+    The key of a position is the XOR of the key of every blocked cell, the
+    location key of each player that has moved, and the side key when player
+    2 holds the initiative. The tables are generated from a fixed seed, so
+    keys are identical across processes and runs (e.g., for opening books or
+    tables shared between workers).
+
+    Parameters
+    ----------
+    width : int
+        The number of columns of the board.
+
+    height : int
+        The number of rows of the board.
+
+    Returns
+    -------
+    (tuple<int>, (tuple<int>, tuple<int>), int)
+        A tuple (cell_keys, location_keys, side_key) where cell_keys[i] is
+        the key of blocked cell i, location_keys[0][i] and location_keys[1][i]
+        are the keys for player 1 and player 2 standing on cell i, and
+        side_key is the key of player 2 to move.
+    """
+    key = (width, height)
+    tables = _ZOBRIST_TABLES.get(key)
+    if tables is None:
+        rng = random.Random("zobrist-{}x{}".format(width, height))
+        size = width * height
+        cell_keys = tuple(rng.getrandbits(64) for _ in range(size))
+        location_keys = (tuple(rng.getrandbits(64) for _ in range(size)),
+                         tuple(rng.getrandbits(64) for _ in range(size)))
+        tables = (cell_keys, location_keys, rng.getrandbits(64))
+        _cache_tables(_ZOBRIST_TABLES, key, tables)
+    return tables
+
+
+def _state_hash(keys, blocked, locations, move_count):
+    """Compute the Zobrist key of a state from scratch."""
+    cell_keys, location_keys, side_key = keys
+    key = side_key if move_count % 2 else 0
+    for idx in blocked:
+        key ^= cell_keys[idx]
+    for player_idx, idx in enumerate(locations):
+        if idx is not None:
+            key ^= location_keys[player_idx][idx]
+    return key
+
+
+# A symmetry of the board as two cell permutations: forward[i] is the flat
+# index of the cell that cell i maps to, and inverse undoes the mapping
+Symmetry = namedtuple("Symmetry", ["forward", "inverse"])
+
+# Symmetries and permuted Zobrist keys shared by every board with the same
+# (width, height)
+_SYMMETRY_TABLES = {}
+
+
+def _symmetry_tables(width, height):
+    """Return the symmetries of a board geometry together with the Zobrist
+    keys permuted by each of them.
+    """
+    key = (width, height)
+    tables = _SYMMETRY_TABLES.get(key)
+    if tables is None:
+        last_row, last_col = height - 1, width - 1
+        transforms = [lambda r, c: (r, c),
+                      lambda r, c: (last_row - r, c),
+                      lambda r, c: (r, last_col - c),
+                      lambda r, c: (last_row - r, last_col - c)]
+        if width == height:
+            transforms += [lambda r, c: (c, r),
+                           lambda r, c: (last_col - c, r),
+                           lambda r, c: (c, last_row - r),
+                           lambda r, c: (last_col - c, last_row - r)]
+        _, cells = knight_neighbors(width, height)
+        cell_keys, location_keys, _ = zobrist_keys(width, height)
+        symmetries = []
+        permuted_keys = []
+        for transform in transforms:
+            forward = tuple(r + c * height for r, c in
+                            (transform(row, col) for row, col in cells))
+            inverse = [0] * len(forward)
+            for idx, image in enumerate(forward):
+                inverse[image] = idx
+            symmetries.append(Symmetry(forward, tuple(inverse)))
+            permuted_keys.append((
+                tuple(cell_keys[image] for image in forward),
+                tuple(tuple(keys[image] for image in forward)
+                      for keys in location_keys)))
+        tables = (tuple(symmetries), tuple(permuted_keys))
+        _cache_tables(_SYMMETRY_TABLES, key, tables)
+    return tables
+
+
+def board_symmetries(width, height):
+    """Return the symmetries of a board geometry.
+
+    Rectangular boards have 4 symmetries (the identity, the two reflections
+    and the half turn); square boards also have the quarter turns and the
+    two diagonal reflections, for 8 in total. Mapping every cell of a
+    position through a symmetry gives a position with the same game value.
+
+    Parameters
+    ----------
+    width : int
+        The number of columns of the board.
+
+    height : int
+        The number of rows of the board.
+
+    Returns
+    -------
+    tuple<Symmetry>
+        The symmetries of the board, starting with the identity.
+    """
+    return _symmetry_tables(width, height)[0]
+
 
 class Board(object):
     """Implement a model for the game Isolation assuming each player moves like
@@ -33,27 +229,95 @@ class Board(object):
 
     height : int (optional)
         The number of rows that the board should have.
+
+    shuffle : bool (optional)
+        If True (default), get_legal_moves() returns the moves of a placed
+        player in random order. If False, moves are always returned in the
+        same stable order, which makes searches reproducible and saves the
+        cost of shuffling every move list.
     """
     BLANK = 0
     NOT_MOVED = None
 
-    def __init__(self, player_1, player_2, width=7, height=7):
+    def __init__(self, player_1, player_2, width=7, height=7, shuffle=True):
         self.width = width
         self.height = height
+        self.shuffle = shuffle
         self.move_count = 0
         self._player_1 = player_1
         self._player_2 = player_2
         self._active_player = player_1
         self._inactive_player = player_2
+        self._neighbors, self._cells = knight_neighbors(width, height)
+        self._zobrist_keys = zobrist_keys(width, height)
+        self._zobrist = 0
 
         # The last 3 entries of the board state includes initiative (0 for
         # player 1, 1 for player 2) player 2 last move, and player 1 last move
         self._board_state = [Board.BLANK] * (width * height + 3)
         self._board_state[-1] = Board.NOT_MOVED
         self._board_state[-2] = Board.NOT_MOVED
+        # Sparse index of the blocked cells, in the order they were blocked,
+        # so that the blank cells can be counted and the state snapshot taken
+        # without scanning every cell of large boards
+        self._blocked_cells = []
+
+        # Moves applied with push_move() as (cell index, last move slot,
+        # previous value of that slot, previous Zobrist key) so that
+        # pop_move() can undo them
+        self._undo_stack = []
 
     def hash(self):
-        return str(self._board_state).__hash__()
+        """Return the 64-bit Zobrist key of the current state. The key covers
+        the blocked cells, both player locations and the player holding the
+        initiative, and is updated incrementally in O(1) by every move.
+        """
+        return self._zobrist
+
+    def canonical_key(self):
+        """Return a key shared by the current position and all of its
+        reflections and rotations, e.g., to index opening books or endgame
+        tables that store each class of symmetric positions once.
+
+        The key is the smallest Zobrist key (see hash()) among the symmetric
+        images of the position, and is computed from scratch in O(8 * number
+        of blocked cells).
+
+        Returns
+        -------
+        (int, Symmetry)
+            The canonical key and the symmetry that maps this position to the
+            image the key belongs to. Pass the symmetry to to_canonical() and
+            from_canonical() to convert moves between the two frames.
+        """
+        symmetries, permuted_keys = _symmetry_tables(self.width, self.height)
+        state = self.get_state()
+        blocked = state["blocked"]
+        locations = state["locations"]
+        side_key = self._zobrist_keys[2] if self.move_count % 2 else 0
+        best_key = best_symmetry = None
+        for symmetry, (cell_keys, location_keys) in zip(symmetries, permuted_keys):
+            key = side_key
+            for idx in blocked:
+                key ^= cell_keys[idx]
+            for player_idx, idx in enumerate(locations):
+                if idx is not None:
+                    key ^= location_keys[player_idx][idx]
+            if best_key is None or key < best_key:
+                best_key, best_symmetry = key, symmetry
+        return best_key, best_symmetry
+
+    def to_canonical(self, move, symmetry):
+        """Map a move on this board to the frame of the canonical position
+        returned with `symmetry` by canonical_key().
+        """
+        return self._cells[symmetry.forward[move[0] + move[1] * self.height]]
+
+    def from_canonical(self, move, symmetry):
+        """Map a move in the frame of the canonical position back onto this
+        board; the inverse of to_canonical().
+        """
+        return self._cells[symmetry.inverse[move[0] + move[1] * self.height]]
 
     @property
     def active_player(self):
@@ -92,13 +356,87 @@ class Board(object):
 
     def copy(self):
         """ Return a deep copy of the current board. """
-        new_board = Board(self._player_1, self._player_2, width=self.width, height=self.height)
+        # Bypass __init__, which would look up the shared tables and build a
+        # blank state only for it to be overwritten
+        new_board = Board.__new__(Board)
+        new_board.width = self.width
+        new_board.height = self.height
+        new_board.shuffle = self.shuffle
         new_board.move_count = self.move_count
+        new_board._player_1 = self._player_1
+        new_board._player_2 = self._player_2
         new_board._active_player = self._active_player
         new_board._inactive_player = self._inactive_player
+        new_board._neighbors = self._neighbors
+        new_board._cells = self._cells
+        new_board._zobrist_keys = self._zobrist_keys
+        new_board._zobrist = self._zobrist
         new_board._board_state = copy(self._board_state)
+        new_board._blocked_cells = copy(self._blocked_cells)
+        new_board._undo_stack = []
         return new_board
 
+    def get_state(self):
+        """Return a snapshot of the game state that does not reference the
+        player objects, e.g., to send a position to another process or to
+        store it in a file. The snapshot only holds ints, lists and None, so
+        it can be pickled or serialized as JSON.
+
+        Returns
+        -------
+        dict
+            A dict with the board "width" and "height", the "move_count",
+            the flat index (row + column * height) of every "blocked" cell,
+            and the flat index of the last move of player 1 and player 2 in
+            "locations" (None for a player that has not moved).
+        """
+        return {"width": self.width, "height": self.height,
+                "move_count": self.move_count,
+                "blocked": sorted(self._blocked_cells),
+                "locations": list(self._locations())}
+
+    @classmethod
+    def from_state(cls, player_1, player_2, state, shuffle=True):
+        """Create a board in the position described by a get_state() snapshot.
+
+        Parameters
+        ----------
+        player_1 : object
+            The object to register as player 1.
+
+        player_2 : object
+            The object to register as player 2.
+
+        state : dict
+            A snapshot returned by get_state().
+
+        shuffle : bool (optional)
+            Passed on to the board constructor.
+
+        Returns
+        -------
+        isolation.Board
+            A new board of the same class as the one this is called on.
+        """
+        board = cls(player_1, player_2, width=state["width"],
+                    height=state["height"], shuffle=shuffle)
+        board._load_state(state["blocked"], state["locations"],
+                          state["move_count"])
+        return board
+
+    def _load_state(self, blocked, locations, move_count):
+        """Overwrite the state of a freshly constructed board."""
+        for idx in blocked:
+            self._board_state[idx] = 1
+        self._blocked_cells = list(blocked)
+        self._board_state[-1], self._board_state[-2] = locations
+        self._board_state[-3] = move_count % 2
+        self.move_count = move_count
+        if move_count % 2:
+            self._active_player, self._inactive_player = self._player_2, self._player_1
+        self._zobrist = _state_hash(self._zobrist_keys, blocked, locations,
+                                    move_count)
+
     def forecast_move(self, move):
         """Return a deep copy of the current game with an input move applied to
         advance the game one ply.
@@ -139,8 +477,10 @@ class Board(object):
     def get_blank_spaces(self):
         """Return a list of the locations that are still available on the board.
         """
-        return [(i, j) for j in range(self.width) for i in range(self.height)
-                if self._board_state[i + j * self.height] == Board.BLANK]
+        if not self._blocked_cells:
+            return list(self._cells)
+        state = self._board_state
+        return [cell for idx, cell in enumerate(self._cells) if not state[idx]]
 
     def get_player_location(self, player):
         """Find the current location of the specified player on the board.
@@ -188,7 +528,66 @@ class Board(object):
         """
         if player is None:
             player = self.active_player
-        return self.__get_moves(self.get_player_location(player))
+        return self.__get_moves(self._location_index(player))
+
+    def mobility(self, player=None):
+        """Return the number of legal moves for the specified player.
+
+        Equivalent to len(self.get_legal_moves(player)), but counts the open
+        cells of the precomputed neighbor table without building the list.
+
+        Parameters
+        ----------
+        player : object (optional)
+            An object registered as a player in the current game. If None,
+            count the legal moves for the active player on the board.
+
+        Returns
+        -------
+        int
+            The number of legal moves for the player.
+        """
+        if player is None:
+            player = self._active_player
+        idx = self._location_index(player)
+        state = self._board_state
+        if idx == Board.NOT_MOVED:
+            return self.width * self.height - len(self._blocked_cells)
+        count = 0
+        for n in self._neighbors[idx]:
+            if not state[n]:
+                count += 1
+        return count
+
+    def evaluation_context(self, player):
+        """Count the legal moves of both players once and derive the utility
+        of the state from them.
+
+        Heuristics that need both mobility counts and the terminal tests
+        (is_winner(), is_loser()) should call this once instead of calling
+        those methods separately, which would generate the active player's
+        moves up to four times.
+
+        Parameters
+        ----------
+        player : object
+            An object registered as a player in the current game.
+
+        Returns
+        -------
+        EvaluationContext
+            A tuple (own_moves, opp_moves, utility) with the number of legal
+            moves of the player and of its opponent, and the value that
+            utility(player) would return.
+        """
+        own_moves = self.mobility(player)
+        if player == self._active_player:
+            opp_moves = self.mobility(self._inactive_player)
+            utility = 0. if own_moves else float("-inf")
+        else:
+            opp_moves = self.mobility(self._active_player)
+            utility = 0. if opp_moves else float("inf")
+        return EvaluationContext(own_moves, opp_moves, utility)
 
     def apply_move(self, move):
         """Move the active player to a specified location.
@@ -200,20 +599,59 @@ class Board(object):
             the active player on the board.
         """
         idx = move[0] + move[1] * self.height
-        last_move_idx = int(self.active_player == self._player_2) + 1
-        self._board_state[-last_move_idx] = idx
+        player_idx = int(self._active_player == self._player_2)
+        last_move = self._board_state[-1 - player_idx]
+        cell_keys, location_keys, side_key = self._zobrist_keys
+        location_keys = location_keys[player_idx]
+        key = self._zobrist ^ cell_keys[idx] ^ location_keys[idx] ^ side_key
+        if last_move != Board.NOT_MOVED:
+            key ^= location_keys[last_move]
+        self._zobrist = key
+        self._board_state[-1 - player_idx] = idx
         self._board_state[idx] = 1
         self._board_state[-3] ^= 1
+        self._blocked_cells.append(idx)
         self._active_player, self._inactive_player = self._inactive_player, self._active_player
         self.move_count += 1
 
+    def push_move(self, move):
+        """Move the active player to a specified location in-place, recording
+        the information needed to take the move back with pop_move().
+
+        This is the allocation-free alternative to forecast_move() for search
+        code: apply a move with push_move(), search the resulting position,
+        then restore the original position with pop_move().
+
+        Parameters
+        ----------
+        move : (int, int)
+            A coordinate pair (row, column) indicating the next position for
+            the active player on the board.
+        """
+        last_move_idx = -1 - int(self._active_player == self._player_2)
+        self._undo_stack.append((move[0] + move[1] * self.height, last_move_idx,
+                                 self._board_state[last_move_idx], self._zobrist))
+        self.apply_move(move)
+
+    def pop_move(self):
+        """Undo the most recent move applied with push_move(), restoring the
+        board to the exact state it had before that move.
+        """
+        idx, last_move_idx, last_move, self._zobrist = self._undo_stack.pop()
+        self._board_state[last_move_idx] = last_move
+        self._board_state[idx] = Board.BLANK
+        self._board_state[-3] ^= 1
+        self._blocked_cells.pop()
+        self._active_player, self._inactive_player = self._inactive_player, self._active_player
+        self.move_count -= 1
+
     def is_winner(self, player):
         """ Test whether the specified player has won the game. """
-        return player == self._inactive_player and not self.get_legal_moves(self._active_player)
+        return player == self._inactive_player and not self.mobility(self._active_player)
 
     def is_loser(self, player):
         """ Test whether the specified player has lost the game. """
-        return player == self._active_player and not self.get_legal_moves(self._active_player)
+        return player == self._active_player and not self.mobility(self._active_player)
 
     def utility(self, player):
         """Returns the utility of the current game state from the perspective
@@ -237,7 +675,7 @@ class Board(object):
             a value of -inf if the player has lost, and a value of 0
             otherwise.
         """
-        if not self.get_legal_moves(self._active_player):
+        if not self.mobility(self._active_player):
 
             if player == self._inactive_player:
                 return float("inf")
@@ -247,19 +685,34 @@ class Board(object):
 
         return 0.
 
-    def __get_moves(self, loc):
+    def _locations(self):
+        """Return the cell indices of the last moves of player 1 and player 2
+        (NOT_MOVED for a player that has not moved).
+        """
+        return self._board_state[-1], self._board_state[-2]
+
+    def _location_index(self, player):
+        """Return the cell index of the last move of the player, or NOT_MOVED.
+        """
+        if player == self._player_1:
+            return self._board_state[-1]
+        elif player == self._player_2:
+            return self._board_state[-2]
+        raise RuntimeError(
+            "Invalid player in get_player_location: {}".format(player))
+
+    def __get_moves(self, idx):
         """Generate the list of possible moves for an L-shaped motion (like a
-        knight in chess).
+        knight in chess) from the cell with flat index idx.
         """
-        if loc == Board.NOT_MOVED:
+        if idx == Board.NOT_MOVED:
             return self.get_blank_spaces()
 
-        r, c = loc
-        directions = [(-2, -1), (-2, 1), (-1, -2), (-1, 2),
-                      (1, -2), (1, 2), (2, -1), (2, 1)]
-        valid_moves = [(r + dr, c + dc) for dr, dc in directions
-                       if self.move_is_legal((r + dr, c + dc))]
-        random.shuffle(valid_moves)
+        state = self._board_state
+        cells = self._cells
+        valid_moves = [cells[n] for n in self._neighbors[idx] if not state[n]]
+        if self.shuffle:
+            random.shuffle(valid_moves)
         return valid_moves
 
     def print_board(self):
@@ -271,8 +724,7 @@ class Board(object):
         the location of each player and indicating which cells have been
         blocked, and which remain open.
         """
-        p1_loc = self._board_state[-1]
-        p2_loc = self._board_state[-2]
+        p1_loc, p2_loc = self._locations()
 
         col_margin = len(str(self.height - 1)) + 1
         prefix = "{:<" + "{}".format(col_margin) + "}"
@@ -295,7 +747,7 @@ class Board(object):
 
         return out
 
-    def play(self, time_limit=TIME_LIMIT_MILLIS):
+    def play(self, time_limit=TIME_LIMIT_MILLIS, record=None):
         """Execute a match between the players by alternately soliciting them
         to select a move and applying it in the game.
 
@@ -305,13 +757,48 @@ class Board(object):
             The maximum number of milliseconds to allow before timeout
             during each turn.
 
+        record : callable (optional)
+            If given, called with the `GameRecord` of the game when it ends,
+            e.g., the write() method of an `isolation.GameRecordWriter`.
+
         Returns
         ----------
         (player, list<[(int, int),]>, str)
             Return multiple including the winning player, the complete game
             move history, and a string indicating the reason for losing
             (e.g., timeout or invalid move).
+
+        Notes
+        -----
+            Players may search on their opponent's time by defining two
+            methods. ponder(game) is called with a copy of the board right
+            after the player's move is applied, before the opponent's clock
+            starts, and must return immediately (e.g., after handing the
+            position to worker processes). stop_pondering() is called at the
+            start of the player's next turn, after its clock has started, so
+            the time it takes to stop counts against the player, and once
+            more when the game ends.
+        """
+        try:
+            winner, move_history, termination, times, initial_state = self._play(
+                time_limit, record is not None)
+        finally:
+            for player in (self._player_1, self._player_2):
+                stop_pondering = getattr(player, "stop_pondering", None)
+                if stop_pondering is not None:
+                    stop_pondering()
+        if record is not None:
+            record(GameRecord(initial_state, [tuple(move) for move in move_history],
+                              times, int(winner == self._player_2),
+                              termination, None))
+        return winner, move_history, termination
+
+    def _play(self, time_limit, timed):
+        """Implement play(), also returning the time used by every move and
+        the starting position when timed is True.
         """
+        initial_state = self.get_state() if timed else None
+        times = []
         move_history = []
 
         time_millis = lambda: 1000 * timeit.default_timer()
@@ -323,20 +810,34 @@ class Board(object):
 
             move_start = time_millis()
             time_left = lambda : time_limit - (time_millis() - move_start)
+            stop_pondering = getattr(self._active_player, "stop_pondering", None)
+            if stop_pondering is not None:
+                stop_pondering()
             curr_move = self._active_player.get_move(game_copy, time_left)
             move_end = time_left()
+            if timed:
+                times.append(time_limit - move_end)
 
             if curr_move is None:
                 curr_move = Board.NOT_MOVED
 
             if move_end < 0:
-                return self._inactive_player, move_history, "timeout"
-
-            if curr_move not in legal_player_moves:
+                termination = "timeout"
+            elif curr_move not in legal_player_moves:
                 if len(legal_player_moves) > 0:
-                    return self._inactive_player, move_history, "forfeit"
-                return self._inactive_player, move_history, "illegal move"
+                    termination = "forfeit"
+                else:
+                    termination = "illegal move"
+            else:
+                termination = None
+            if termination is not None:
+                return (self._inactive_player, move_history, termination,
+                        times, initial_state)
 
             move_history.append(list(curr_move))
 
             self.apply_move(curr_move)
+
+            ponder = getattr(self._inactive_player, "ponder", None)
+            if ponder is not None:
+                ponder(self.copy())
@@ -0,0 +1,134 @@
+"""
+This file contains `GameRecordWriter` and `read_records`, which store the
+`GameRecord` tuples produced by `Board.play(record=...)` as JSON lines, and
+`replay`, which rebuilds any position of a recorded game from the record
+alone, without running the agents that played it.
+
+Each line of a record file is a JSON object with the fields of `GameRecord`;
+moves are stored as [row, column] pairs and times in milliseconds. Files
+whose name ends in ".gz" are compressed with gzip.
+"""
+import gzip
+import json
+
+from .isolation import Board, GameRecord
+
+
+def _open(path, mode):
+    """Open a record file in text mode, through gzip if its name ends in
+    ".gz".
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t")
+    return open(path, mode)
+
+
+class GameRecordWriter:
+    """Append game records to a JSON lines file.
+
+    The write() method can be passed directly as the `record` argument of
+    `Board.play()`::
+
+        with GameRecordWriter("games.jsonl") as writer:
+            game.play(record=writer.write)
+
+    Parameters
+    ----------
+    path : str
+        The file to append to; it is created if it does not exist.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = _open(path, "a")
+
+    def write(self, record):
+        """Append one `GameRecord` to the file."""
+        entry = record._asdict()
+        entry["moves"] = [list(move) for move in record.moves]
+        entry["times"] = [round(t, 3) for t in record.times]
+        self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self.count += 1
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_records(path):
+    """Yield the `GameRecord` tuples stored in a file written by
+    `GameRecordWriter`, in order.
+    """
+    with _open(path, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            entry["moves"] = [tuple(move) for move in entry["moves"]]
+            yield GameRecord(**entry)
+
+
+class _Player:
+    """Placeholder player registered on replayed boards."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return "<{}>".format(self.name)
+
+
+def replay(record, ply=None, player_1=None, player_2=None, board_class=Board):
+    """Rebuild the position of a recorded game after a number of moves.
+
+    Parameters
+    ----------
+    record : GameRecord
+        The recorded game.
+
+    ply : int (optional)
+        The number of recorded moves to apply to the starting position; the
+        final position of the game by default. Negative values count from
+        the end, like list indices.
+
+    player_1, player_2 : object (optional)
+        The objects to register as the players of the board; placeholders
+        named after record.players by default.
+
+    board_class : class (optional)
+        The board implementation to build, e.g. `isolation.BitBoard`.
+
+    Returns
+    -------
+    isolation.Board
+    """
+    names = record.players or ("player 1", "player 2")
+    if player_1 is None:
+        player_1 = _Player(names[0])
+    if player_2 is None:
+        player_2 = _Player(names[1])
+    game = board_class.from_state(player_1, player_2, record.state,
+                                  shuffle=False)
+    for move in record.moves[:ply]:
+        game.apply_move(move)
+    return game
+
+
+def positions(record, player_1=None, player_2=None, board_class=Board):
+    """Yield (game, move) for every position of a recorded game in order,
+    where move is the move played from it (None for the final position).
+
+    The same board object is advanced between steps, so copy it to keep a
+    position. Arguments are the same as for `replay()`.
+    """
+    game = replay(record, 0, player_1, player_2, board_class)
+    for move in record.moves:
+        yield game, move
+        game.apply_move(move)
+    yield game, None
@@ -0,0 +1,228 @@
+"""Build and use an opening book for Isolation.
+
+The book maps every position of the first few plies of the game to the move
+chosen by a deep fixed-depth alpha-beta search. Positions that are mirror
+images or rotations of each other share one entry: each position is stored
+under its `Board.canonical_key()`, and its move is stored in the frame of
+the canonical position, so the book for a 7x7 board is roughly
+eight times smaller than the number of positions it answers.
+
+Build a book offline, then let `OpeningBookPlayer` answer from it::
+
+    python opening_book.py --plies 3 --depth 8 --output book.bin
+
+    book = OpeningBook.load("book.bin")
+    player = OpeningBookPlayer(book, score_fn=improved_score)
+
+Books are saved in a compact binary format: a 12 byte header followed by
+one 10 byte (key, move) record per position.
+"""
+import argparse
+import multiprocessing
+import struct
+import timeit
+
+from isolation import Board
+from game_agent import AlphaBetaPlayer, custom_score_2
+
+_HEADER = struct.Struct("<4sBBBxI")
+_ENTRY = struct.Struct("<QH")
+_MAGIC = b"ISOB"
+
+
+class OpeningBook:
+    """A table of the best move for the positions of the first plies of
+    games on one board size.
+
+    Parameters
+    ----------
+    width, height : int (optional)
+        The size of the boards the book applies to.
+
+    plies : int (optional)
+        The book covers positions with a move count below this number.
+    """
+
+    def __init__(self, width=7, height=7, plies=3):
+        self.width = width
+        self.height = height
+        self.plies = plies
+        self._moves = {}
+
+    def __len__(self):
+        return len(self._moves)
+
+    def add(self, game, move):
+        """Record move as the answer for the current position of game."""
+        key, symmetry = game.canonical_key()
+        row, col = game.to_canonical(move, symmetry)
+        self._moves[key] = row + col * self.height
+
+    def lookup(self, game):
+        """Return the book move for the current position of game, or None if
+        the position is not in the book.
+        """
+        if (game.move_count >= self.plies or game.width != self.width or
+                game.height != self.height):
+            return None
+        key, symmetry = game.canonical_key()
+        idx = self._moves.get(key)
+        if idx is None:
+            return None
+        return game.from_canonical((idx % self.height, idx // self.height),
+                                   symmetry)
+
+    def save(self, path):
+        """Write the book to a file."""
+        with open(path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, self.width, self.height, self.plies,
+                                 len(self._moves)))
+            for key in sorted(self._moves):
+                f.write(_ENTRY.pack(key, self._moves[key]))
+
+    @classmethod
+    def load(cls, path):
+        """Read a book written by save()."""
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, width, height, plies, count = _HEADER.unpack_from(data)
+        if magic != _MAGIC:
+            raise ValueError("{} is not an opening book".format(path))
+        book = cls(width, height, plies)
+        book._moves = dict(_ENTRY.iter_unpack(data[_HEADER.size:]))
+        if len(book._moves) != count:
+            raise ValueError("{} is truncated".format(path))
+        return book
+
+
+class _Opponent:
+    """Placeholder for the opponent on the boards searched by the builder."""
+
+
+def _search_position(task):
+    """Search one book position; return (state, best move)."""
+    state, depth, score_fn = task
+    player = AlphaBetaPlayer(score_fn=score_fn)
+    player.time_left = lambda: float("inf")
+    if state["move_count"] % 2:
+        game = Board.from_state(_Opponent(), player, state, shuffle=False)
+    else:
+        game = Board.from_state(player, _Opponent(), state, shuffle=False)
+    for d in range(1, depth + 1):
+        move = player.alphabeta(game, d)
+    return state, move
+
+
+def build_book(width=7, height=7, plies=3, depth=8, score_fn=custom_score_2,
+               processes=1):
+    """Build an opening book by searching every symmetry-distinct position
+    with a move count below `plies` to a fixed depth.
+
+    Parameters
+    ----------
+    width, height : int (optional)
+        The board size.
+
+    plies : int (optional)
+        Positions with a move count below this number are added to the book.
+
+    depth : int (optional)
+        The depth of the iterative deepening alpha-beta search of each
+        position.
+
+    score_fn : callable (optional)
+        The evaluation function of the search.
+
+    processes : int (optional)
+        Number of worker processes searching positions in parallel (0 for
+        one per CPU core).
+
+    Returns
+    -------
+    OpeningBook
+    """
+    book = OpeningBook(width, height, plies)
+    positions = []
+    seen = set()
+    frontier = [Board(_Opponent(), _Opponent(), width, height, shuffle=False)]
+    while frontier:
+        game = frontier.pop()
+        if game.move_count >= plies or not game.get_legal_moves():
+            continue
+        key = game.canonical_key()[0]
+        if key in seen:
+            continue
+        seen.add(key)
+        positions.append(game.get_state())
+        frontier.extend(game.forecast_move(move)
+                        for move in game.get_legal_moves())
+
+    tasks = [(state, depth, score_fn) for state in positions]
+    if processes == 1:
+        results = list(map(_search_position, tasks))
+    else:
+        with multiprocessing.Pool(processes or None) as pool:
+            results = pool.map(_search_position, tasks)
+    for state, move in results:
+        book.add(Board.from_state(_Opponent(), _Opponent(), state), move)
+    return book
+
+
+class OpeningBookPlayer(AlphaBetaPlayer):
+    """AlphaBetaPlayer that plays book moves while the game is in the book
+    and searches normally afterwards.
+
+    Parameters
+    ----------
+    book : OpeningBook
+        The book to answer from.
+
+    See `AlphaBetaPlayer` for the remaining parameters.
+
+    Attributes
+    ----------
+    book_hits : int
+        The number of moves answered from the book.
+    """
+
+    def __init__(self, book, **kwargs):
+        super().__init__(**kwargs)
+        self.book = book
+        self.book_hits = 0
+
+    def get_move(self, game, time_left):
+        """Return the book move for the position if there is one, otherwise
+        search for the best move with `AlphaBetaPlayer.get_move()`.
+        """
+        move = self.book.lookup(game)
+        if move is not None:
+            self.book_hits += 1
+            return move
+        return super().get_move(game, time_left)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--output", default="book.bin",
+                        help="file to write the book to")
+    parser.add_argument("--width", type=int, default=7)
+    parser.add_argument("--height", type=int, default=7)
+    parser.add_argument("--plies", type=int, default=3,
+                        help="book positions with a move count below this")
+    parser.add_argument("--depth", type=int, default=8,
+                        help="search depth of every book position")
+    parser.add_argument("-p", "--processes", type=int, default=1,
+                        help="number of worker processes (0 for one per "
+                             "CPU core)")
+    args = parser.parse_args()
+
+    start = timeit.default_timer()
+    book = build_book(args.width, args.height, args.plies, args.depth,
+                      processes=args.processes)
+    book.save(args.output)
+    print("Wrote {} positions to {} in {:.1f}s".format(
+        len(book), args.output, timeit.default_timer() - start))
+
+
+if __name__ == "__main__":
+    main()
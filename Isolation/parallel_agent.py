@@ -0,0 +1,462 @@
+"""Multi-process "lazy SMP" search for the AlphaBetaPlayer.
+
+`ParallelAlphaBetaPlayer` keeps a set of worker processes alive between
+moves. On every call to get_move() each worker runs the same iterative
+deepening alpha-beta search as the main process, from the same root, and
+all of them share one transposition table that lives in shared memory.  The
+searches diverge because the workers shuffle their root moves and read each
+other's results from the table, so together they reach deeper iterations
+than a single process in the same time.  When the main search runs out of
+time it stops the workers and plays the move of the deepest iteration
+completed by any process.
+
+With `pondering=True` the workers also search while the opponent thinks:
+after every move the player predicts the opponent's reply from the best
+move stored in the table, and the workers search the position after that
+reply until the player's next turn. Their results stay in the shared table,
+so when the prediction is right the next search starts from a table that
+already holds deep results for its root.
+
+This agent is kept out of `game_agent.py` because the Project Assistant
+sandbox does not allow the `multiprocessing` module.
+"""
+import ctypes
+import random
+import struct
+import timeit
+import multiprocessing
+import warnings
+from multiprocessing.connection import wait
+
+from isolation import Board
+from game_agent import AlphaBetaPlayer, custom_score_2
+
+_DOUBLE = struct.Struct("<d")
+_QWORD = struct.Struct("<Q")
+
+# Layout of the data word of a shared table entry: depth (8 bits), bound
+# (2 bits), generation (8 bits), best move (33 bits: one plus the row and
+# the column packed in 16 bits each, 0 for no move) and a valid flag
+_BOUND_SHIFT = 8
+_GENERATION_SHIFT = 10
+_MOVE_SHIFT = 18
+_COORD_BITS = 16
+_COORD_MASK = (1 << _COORD_BITS) - 1
+_MOVE_MASK = (1 << 2 * _COORD_BITS + 1) - 1
+_VALID = 1 << 63
+
+
+class SharedTranspositionTable:
+    """Transposition table stored in shared memory so that several processes
+    can read and write it concurrently.
+
+    It has the same interface and replacement policy as
+    `game_agent.TranspositionTable`. Every slot holds three unsigned 64-bit
+    words: a check word, a data word (depth, bound, generation and best
+    move) and the raw bits of the value. The check word is the XOR of the
+    key with the two other words, so an entry torn by two processes writing
+    the same slot at once fails the key comparison and reads as a miss; no
+    locks are needed.
+
+    Parameters
+    ----------
+    max_bytes : int (optional)
+        Approximate memory cap for the table; each slot takes 24 bytes.
+    """
+    ENTRY_BYTES = 24
+
+    def __init__(self, max_bytes=16 * 2**20):
+        self.size = max(1, max_bytes // self.ENTRY_BYTES)
+        self.hits = 0
+        self.misses = 0
+        self._slots = multiprocessing.RawArray("Q", 3 * self.size)
+        self._generation = multiprocessing.RawValue("B", 0)
+        self._owner = True
+
+    def attach(self):
+        """Return a view of this table for use in a worker process; searches
+        through the view do not advance the generation.
+        """
+        view = SharedTranspositionTable.__new__(SharedTranspositionTable)
+        view.size = self.size
+        view.hits = view.misses = 0
+        view._slots = self._slots
+        view._generation = self._generation
+        view._owner = False
+        return view
+
+    @property
+    def generation(self):
+        return self._generation.value
+
+    def new_search(self):
+        """Age the current entries; only the owning process does so."""
+        if self._owner:
+            self._generation.value = (self._generation.value + 1) % 256
+
+    def clear(self):
+        """Remove every entry and reset the counters."""
+        ctypes.memset(ctypes.addressof(self._slots), 0,
+                      ctypes.sizeof(self._slots))
+        self.hits = self.misses = 0
+
+    def probe(self, key):
+        """Return the entry stored for key as a tuple (depth, value, bound,
+        best_move), or None if the position is not in the table.
+        """
+        base = 3 * (key % self.size)
+        slots = self._slots
+        data = slots[base + 1]
+        value_bits = slots[base + 2]
+        if not data & _VALID or slots[base] ^ data ^ value_bits != key:
+            self.misses += 1
+            return None
+        self.hits += 1
+        code = (data >> _MOVE_SHIFT) & _MOVE_MASK
+        move = (((code - 1) >> _COORD_BITS, (code - 1) & _COORD_MASK)
+                if code else None)
+        return (data & 255, _DOUBLE.unpack(_QWORD.pack(value_bits))[0],
+                (data >> _BOUND_SHIFT) & 3, move)
+
+    def store(self, key, depth, value, bound, best_move):
+        """Record the result of searching a position to the given depth."""
+        base = 3 * (key % self.size)
+        slots = self._slots
+        generation = self._generation.value
+        old = slots[base + 1]
+        if (old & _VALID and slots[base] ^ old ^ slots[base + 2] != key and
+                depth < old & 255 and
+                (old >> _GENERATION_SHIFT) & 255 == generation):
+            return
+        if best_move is None:
+            code = 0
+        else:
+            row, col = best_move
+            assert 0 <= row <= _COORD_MASK and 0 <= col <= _COORD_MASK, \
+                "moves are stored with {} bits per coordinate".format(_COORD_BITS)
+            code = 1 + (row << _COORD_BITS | col)
+        data = (_VALID | min(depth, 255) | bound << _BOUND_SHIFT |
+                generation << _GENERATION_SHIFT | code << _MOVE_SHIFT)
+        value_bits = _QWORD.unpack(_DOUBLE.pack(value))[0]
+        slots[base] = key ^ data ^ value_bits
+        slots[base + 1] = data
+        slots[base + 2] = value_bits
+
+    def __len__(self):
+        return sum(1 for i in range(self.size) if self._slots[3 * i + 1])
+
+
+class _WorkerPlayer(AlphaBetaPlayer):
+    """Search agent running in a worker process; it reports the result of
+    every completed iteration back to the main process.
+    """
+
+    def __init__(self, conn, **kwargs):
+        super().__init__(**kwargs)
+        self.conn = conn
+        self.job_id = None
+
+    def _search_root(self, game, depth):
+        best_move = super()._search_root(game, depth)
+        self.conn.send((self.job_id, depth, best_move))
+        return best_move
+
+
+class _Opponent:
+    """Placeholder for the opponent on boards rebuilt in a worker."""
+
+
+def _worker_main(conn, table, stop, index, settings):
+    """Serve search jobs sent by a ParallelAlphaBetaPlayer until told to quit.
+
+    Each job is a tuple (job_id, state, budget) where state is a
+    Board.get_state() snapshot with the searching player to move and budget
+    is the search time in milliseconds. The worker reports (job_id, depth,
+    move) after every completed iteration and (job_id, None, None) once it
+    has stopped, either because the budget ran out or because the main
+    process set `stop` to the job id.
+    """
+    player = _WorkerPlayer(conn, tt_bytes=0, tie_break=random.Random(index),
+                           **settings)
+    player.tt = table
+    opponent = _Opponent()
+    while True:
+        job = conn.recv()
+        if job is None:
+            break
+        job_id, state, budget = job
+        deadline = timeit.default_timer() + budget / 1000.
+        player.job_id = job_id
+        if state["move_count"] % 2:
+            game = Board.from_state(opponent, player, state, shuffle=False)
+        else:
+            game = Board.from_state(player, opponent, state, shuffle=False)
+
+        def time_left():
+            if stop.value == job_id:
+                return float("-inf")
+            return 1000. * (deadline - timeit.default_timer())
+        player.get_move(game, time_left)
+        conn.send((job_id, None, None))
+
+
+class ParallelAlphaBetaPlayer(AlphaBetaPlayer):
+    """AlphaBetaPlayer that searches with several processes sharing one
+    transposition table in shared memory (lazy SMP).
+
+    The worker processes are started on the first call to get_move() (or by
+    calling start()) and run until close() is called or the main process
+    exits. If they cannot be started, e.g. because the player is used inside
+    a daemonic multiprocessing worker, the player falls back to the serial
+    AlphaBetaPlayer search.
+
+    Parameters
+    ----------
+    workers : int (optional)
+        Number of worker processes searching next to the main process; one
+        per remaining CPU core by default (and at least one). On a machine
+        with a single core the worker and the main process share it, so
+        they search no deeper than the serial search would.
+
+    tt_bytes : int (optional)
+        Memory cap of the shared transposition table.
+
+    predict_iterations : bool (optional)
+        If True, the main process and the workers stop deepening as soon as
+        their next iteration is not expected to finish in time (see
+        `AlphaBetaPlayer`). False by default: the workers complete deeper
+        iterations than the main process, so the whole turn is searched.
+
+    pondering : bool (optional)
+        If True, the workers search the predicted position on the
+        opponent's time when the player is used with `Board.play()` and
+        there are enough cores for it (see ponder()). A warning is issued
+        the first time pondering is skipped for lack of cores.
+
+    See `AlphaBetaPlayer` for the remaining parameters.
+
+    Attributes
+    ----------
+    completed_depth : int
+        The deepest iteration completed on the last move, by the main
+        process or by any worker.
+
+    worker_depths : list<int>
+        The deepest iteration completed by each worker on the last move (0
+        for a worker that completed none, e.g. because it was still starting
+        up when the main search ended).
+
+    ponder_moves : int
+        The number of opponent turns the workers pondered on.
+
+    ponder_hits : int
+        The number of those turns where the opponent played the predicted
+        reply.
+    """
+    # Search budget in milliseconds of pondering jobs, which run until they
+    # are stopped
+    PONDER_BUDGET = 1e9
+
+    # Number of cores that must be left to the opponent for the workers to
+    # ponder; with the default workers=cpu_count() - 1 there is only one
+    PONDER_SPARE_CORES = 1
+
+    def __init__(self, search_depth=3, score_fn=custom_score_2, timeout=10.,
+                 tie_break=None, tt_bytes=16 * 2**20, pvs=False,
+                 aspiration=None, workers=None, predict_iterations=False,
+                 max_extensions=0, quiescence=0, pondering=False,
+                 max_placements=None):
+        super().__init__(search_depth, score_fn, timeout, tie_break, 0, pvs,
+                         aspiration, predict_iterations=predict_iterations,
+                         max_extensions=max_extensions,
+                         quiescence=quiescence, max_placements=max_placements)
+        if workers is None:
+            workers = max(1, multiprocessing.cpu_count() - 1)
+        self.workers = workers
+        self.tt_bytes = tt_bytes
+        self.tt = SharedTranspositionTable(tt_bytes)
+        self.completed_depth = 0
+        self.worker_depths = []
+        self._settings = {"score_fn": score_fn, "timeout": timeout,
+                          "pvs": pvs, "aspiration": aspiration,
+                          "predict_iterations": predict_iterations,
+                          "max_extensions": max_extensions,
+                          "quiescence": quiescence,
+                          "max_placements": max_placements}
+        self.pondering = pondering
+        self.ponder_moves = 0
+        self.ponder_hits = 0
+        self._ponder_job = None
+        self._ponder_key = None
+        self._ponder_warned = False
+        self._job_id = 0
+        self._stop = None
+        self._processes = []
+        self._conns = []
+
+    def __getstate__(self):
+        # Worker processes and shared memory stay with the process that
+        # created them; a copy starts its own on first use
+        state = super().__getstate__()
+        state.update(tt=None, _stop=None, _processes=[], _conns=[],
+                     _ponder_job=None, _ponder_key=None)
+        return state
+
+    def start(self):
+        """Start the worker processes if they are not running yet."""
+        if self._processes or self.workers < 1:
+            return
+        if self.tt is None:
+            self.tt = SharedTranspositionTable(self.tt_bytes)
+        self._stop = multiprocessing.RawValue("l", 0)
+        try:
+            for index in range(self.workers):
+                parent_conn, child_conn = multiprocessing.Pipe()
+                process = multiprocessing.Process(
+                    target=_worker_main, daemon=True,
+                    args=(child_conn, self.tt.attach(), self._stop, index,
+                          self._settings))
+                process.start()
+                self._processes.append(process)
+                self._conns.append(parent_conn)
+        except (AssertionError, OSError):
+            # daemonic processes cannot have children
+            self.close()
+            self.workers = 0
+
+    def close(self):
+        """Stop the worker processes."""
+        self.stop_pondering()
+        for conn in self._conns:
+            try:
+                conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for process in self._processes:
+            process.join(1.)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+        self._conns = []
+
+    def get_move(self, game, time_left):
+        """Search for the best move with the main process and all workers and
+        return the move of the deepest completed iteration. The workers'
+        iterations are collected until TIMER_THRESHOLD expires, even if the
+        main search stops earlier, and the workers are stopped then.
+
+        Parameters
+        ----------
+        game : `isolation.Board`
+            An instance of `isolation.Board` encoding the current state of the
+            game (e.g., player locations and blocked cells).
+
+        time_left : callable
+            A function that returns the number of milliseconds left in the
+            current turn. Returning with any less than 0 ms remaining forfeits
+            the game.
+
+        Returns
+        -------
+        (int, int)
+            Board coordinates corresponding to a legal move; may return
+            (-1, -1) if there are no available legal moves.
+        """
+        self.stop_pondering()
+        if self._ponder_key is not None and game.hash() == self._ponder_key:
+            self.ponder_hits += 1
+        self._ponder_key = None
+        if self.tt is None:
+            self.tt = SharedTranspositionTable(self.tt_bytes)
+        self.start()
+        self._job_id += 1
+        job = (self._job_id, game.get_state(),
+               time_left() - self.TIMER_THRESHOLD)
+        for conn in self._conns:
+            conn.send(job)
+
+        best_move = super().get_move(game, time_left)
+        best_depth = len(self.depth_nodes)
+        self.worker_depths = [0] * len(self._conns)
+        if not self._conns:
+            self.completed_depth = best_depth
+            return best_move
+
+        # Collect the iterations completed by the workers until the turn is
+        # used up, then stop them and collect the last ones
+        stopped = False
+        running = list(self._conns)
+        while running:
+            remaining = time_left() - self.TIMER_THRESHOLD
+            if remaining <= 0 and not stopped:
+                self._stop.value = self._job_id
+                stopped = True
+            if stopped:
+                remaining += self.TIMER_THRESHOLD / 2
+                if remaining <= 0:
+                    break
+            ready = wait(running, max(0., remaining / 1000.))
+            if not ready:
+                if stopped:
+                    break
+                continue
+            for conn in ready:
+                job_id, depth, move = conn.recv()
+                if job_id != self._job_id:
+                    continue
+                if depth is None:
+                    running.remove(conn)
+                    continue
+                index = self._conns.index(conn)
+                self.worker_depths[index] = max(self.worker_depths[index], depth)
+                if depth > best_depth:
+                    best_depth, best_move = depth, move
+
+        self.completed_depth = best_depth
+        return best_move
+
+    def ponder(self, game):
+        """Start searching on the opponent's time; `Board.play()` calls this
+        right after the player's move is applied.
+
+        The opponent's reply is predicted from the best move stored in the
+        table for the position after the player's move, and the workers
+        search the position after that reply until stop_pondering() is
+        called. Nothing happens if pondering is disabled, there are no
+        workers or the table holds no prediction, nor when the machine does
+        not have a core for every worker besides PONDER_SPARE_CORES cores for
+        the opponent, so that pondering never slows the opponent down (a
+        warning tells when pondering is skipped for that reason).
+        """
+        if not self.pondering or not self._conns or game.active_player is self:
+            return
+        if multiprocessing.cpu_count() - len(self._conns) < self.PONDER_SPARE_CORES:
+            if not self._ponder_warned:
+                warnings.warn(
+                    "ParallelAlphaBetaPlayer does not ponder: {} workers leave "
+                    "fewer than {} of the {} cores to the opponent".format(
+                        len(self._conns), self.PONDER_SPARE_CORES,
+                        multiprocessing.cpu_count()))
+                self._ponder_warned = True
+            return
+        entry = self.tt.probe(game.hash() ^ self._tt_salt)
+        reply = entry[3] if entry is not None else None
+        if reply is None or reply not in game.get_legal_moves():
+            return
+        predicted = game.forecast_move(reply)
+        self._job_id += 1
+        self._ponder_job = self._job_id
+        self._ponder_key = predicted.hash()
+        self.ponder_moves += 1
+        job = (self._job_id, predicted.get_state(), self.PONDER_BUDGET)
+        for conn in self._conns:
+            conn.send(job)
+
+    def stop_pondering(self):
+        """Tell the workers to stop pondering; their results stay in the
+        table. The workers acknowledge asynchronously, and get_move()
+        skips those messages.
+        """
+        if self._ponder_job is not None:
+            self._stop.value = self._ponder_job
+            self._ponder_job = None
@@ -30,13 +30,7 @@ def null_score(game, player):
         The heuristic value of the current game state.
     """
 
-    if game.is_loser(player):
-        return float("-inf")
-
-    if game.is_winner(player):
-        return float("inf")
-
-    return 0.
+    return game.utility(player)
 
 
 def open_move_score(game, player):
@@ -59,13 +53,11 @@ def open_move_score(game, player):
     float
         The heuristic value of the current game state
     """
-    if game.is_loser(player):
-        return float("-inf")
-
-    if game.is_winner(player):
-        return float("inf")
+    context = game.evaluation_context(player)
+    if context.utility:
+        return context.utility
 
-    return float(len(game.get_legal_moves(player)))
+    return float(context.own_moves)
 
 
 def improved_score(game, player):
@@ -89,15 +81,11 @@ def improved_score(game, player):
     float
         The heuristic value of the current game state
     """
-    if game.is_loser(player):
-        return float("-inf")
+    context = game.evaluation_context(player)
+    if context.utility:
+        return context.utility
 
-    if game.is_winner(player):
-        return float("inf")
-
-    own_moves = len(game.get_legal_moves(player))
-    opp_moves = len(game.get_legal_moves(game.get_opponent(player)))
-    return float(own_moves - opp_moves)
+    return float(context.own_moves - context.opp_moves)
 
 
 def center_score(game, player):
@@ -122,11 +110,9 @@ def center_score(game, player):
     float
         The heuristic value of the current game state
     """
-    if game.is_loser(player):
-        return float("-inf")
-
-    if game.is_winner(player):
-        return float("inf")
+    utility = game.utility(player)
+    if utility:
+        return utility
 
     w, h = game.width / 2., game.height / 2.
     y, x = game.get_player_location(player)
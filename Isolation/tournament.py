@@ -11,20 +11,25 @@ players, and the players play each match twice -- once as the first player and
 once as the second player.  Randomizing the openings and switching the player
 order corrects for imbalances due to both starting position and initiative.
 """
+import argparse
+import csv
 import itertools
+import json
+import multiprocessing
 import random
 import warnings
 
 from collections import namedtuple
 
-from isolation import Board
+from isolation import Board, GameRecordWriter
 from sample_players import (RandomPlayer, open_move_score,
                             improved_score, center_score)
-from game_agent import (MinimaxPlayer, AlphaBetaPlayer, custom_score,
-                        custom_score_2, custom_score_3)
+from game_agent import (MinimaxPlayer, AlphaBetaPlayer, SearchStats,
+                        custom_score, custom_score_2, custom_score_3)
 
 NUM_MATCHES = 5  # number of matches against each opponent
 TIME_LIMIT = 150  # number of milliseconds before timeout
+SEED = 0  # seed for the random openings; None for different openings each run
 
 DESCRIPTION = """
 This script evaluates the performance of the custom_score evaluation
@@ -37,36 +42,126 @@ game_agent.py.
 Agent = namedtuple("Agent", ["player", "name"])
 
 
-def play_round(cpu_agent, test_agents, win_counts, num_matches):
+def play_game(player_1, player_2, opening, seed, time_limit=TIME_LIMIT):
+    """Play a single game from the given opening moves and report the result.
+
+    The game is fully determined by its arguments (the module-level random
+    generator used by agents such as RandomPlayer is reseeded with `seed`
+    for the game and restored afterwards), so it plays out the same way in
+    this process or in a worker process.
+
+    Returns
+    -------
+    (int, str, list, isolation.GameRecord)
+        The index of the winner (0 for player_1, 1 for player_2), the
+        termination reason returned by Board.play(), for each player the
+        list of search statistics records added during the game (empty for
+        players without a `stats` collector), and the record of the game
+        from the position after the opening.
+    """
+    players = (player_1, player_2)
+    start = [_stats_count(player) for player in players]
+    game = Board(player_1, player_2, shuffle=False)
+    for move in opening:
+        game.apply_move(move)
+    game_records = []
+    random_state = random.getstate()
+    random.seed(seed)
+    try:
+        winner, _, termination = game.play(time_limit=time_limit,
+                                           record=game_records.append)
+    finally:
+        random.setstate(random_state)
+    records = [player.stats.records[count:] if count is not None else []
+               for player, count in zip(players, start)]
+    return int(winner != player_1), termination, records, game_records[0]
+
+
+def _stats_count(player):
+    """Return the number of stats records of the player, or None if it does
+    not collect search statistics.
+    """
+    stats = getattr(player, "stats", None)
+    return None if stats is None else len(stats.records)
+
+
+def _play_game_task(task):
+    """Unpack a play_game() argument tuple (for multiprocessing.Pool.map)."""
+    return play_game(*task)
+
+
+def play_round(cpu_agent, test_agents, win_counts, num_matches, pool=None,
+               dataset=None, games=None, seed=None):
     """Compare the test agents to the cpu agent in "fair" matches.
 
     "Fair" matches use random starting locations and force the agents to
     play as both first and second player to control for advantages resulting
     from choosing better opening moves or having first initiative to move.
+
+    If a multiprocessing pool is given, the games are played in its worker
+    processes, one game per worker at a time, so that each move is timed in
+    a process that is not playing any other game. The players are copied
+    into the workers; results are tallied against the original players.
+
+    If a `heuristic_tuning.PositionDataset` is given, the positions of every
+    game that ended with a player out of moves are added to it. If an
+    `isolation.GameRecordWriter` is given, the record of every game is
+    written to it with the names of the agents that played it.
+
+    The openings and the seed of every game are drawn from a generator
+    seeded with `seed`, which no game touches, so the same seed always
+    produces the same schedule of games, serially or in parallel.
     """
-    timeout_count = 0
-    forfeit_count = 0
+    names = {agent.player: agent.name for agent in [cpu_agent] + test_agents}
+    rng = random.Random(seed)
+    tasks = []
     for _ in range(num_matches):
 
-        games = sum([[Board(cpu_agent.player, agent.player),
-                      Board(agent.player, cpu_agent.player)]
-                    for agent in test_agents], [])
-
         # initialize all games with a random move and response
+        board = Board(cpu_agent.player, test_agents[0].player, shuffle=False)
+        opening = []
         for _ in range(2):
-            move = random.choice(games[0].get_legal_moves())
-            for game in games:
-                game.apply_move(move)
-
-        # play all games and tally the results
-        for game in games:
-            winner, _, termination = game.play(time_limit=TIME_LIMIT)
-            win_counts[winner] += 1
+            move = rng.choice(board.get_legal_moves())
+            board.apply_move(move)
+            opening.append(move)
+
+        # boards return legal moves in a stable order and every game has its
+        # own seed so that (apart from search timing) every run of the
+        # tournament plays the same games, serially or in parallel
+        for agent in test_agents:
+            tasks.append((cpu_agent.player, agent.player, opening,
+                          rng.getrandbits(32), TIME_LIMIT))
+            tasks.append((agent.player, cpu_agent.player, opening,
+                          rng.getrandbits(32), TIME_LIMIT))
+
+    # play all games and tally the results
+    if pool is None:
+        results = map(_play_game_task, tasks)
+    else:
+        results = pool.map(_play_game_task, tasks, chunksize=1)
 
-            if termination == "timeout":
-                timeout_count += 1
-            elif termination == "forfeit":
-                forfeit_count += 1
+    timeout_count = 0
+    forfeit_count = 0
+    for task, (winner, termination, records, game_record) in zip(tasks, results):
+        win_counts[task[winner]] += 1
+
+        if dataset is not None and termination == "illegal move":
+            dataset.add_game(list(task[2]) + game_record.moves, winner)
+        if games is not None:
+            games.write(game_record._replace(
+                players=[names[task[0]], names[task[1]]]))
+
+        # games played in worker processes collect statistics on copies of
+        # the players
+        if pool is not None:
+            for player, player_records in zip(task[:2], records):
+                if player_records:
+                    player.stats.records.extend(player_records)
+
+        if termination == "timeout":
+            timeout_count += 1
+        elif termination == "forfeit":
+            forfeit_count += 1
 
     return timeout_count, forfeit_count
 
@@ -77,8 +172,16 @@ def update(total_wins, wins):
     return total_wins
 
 
-def play_matches(cpu_agents, test_agents, num_matches):
-    """Play matches between the test agent and each cpu_agent individually. """
+def play_matches(cpu_agents, test_agents, num_matches, pool=None,
+                 dataset=None, games=None, seed=SEED):
+    """Play matches between the test agent and each cpu_agent individually.
+
+    The games of each round are played in the worker processes of `pool`
+    when one is given, their positions are added to `dataset` and their
+    records are written to `games` (see `play_round()`). The seed of every
+    round is drawn from a generator seeded with `seed`.
+    """
+    rng = random.Random(seed)
     total_wins = {agent.player: 0 for agent in test_agents}
     total_timeouts = 0.
     total_forfeits = 0.
@@ -93,7 +196,8 @@ def play_matches(cpu_agents, test_agents, num_matches):
 
         print("{!s:^9}{:^13}".format(idx + 1, agent.name), end="", flush=True)
 
-        counts = play_round(agent, test_agents, wins, num_matches)
+        counts = play_round(agent, test_agents, wins, num_matches, pool,
+                            dataset, games, rng.getrandbits(32))
         total_timeouts += counts[0]
         total_forfeits += counts[1]
         total_wins = update(total_wins, wins)
@@ -124,8 +228,62 @@ def play_matches(cpu_agents, test_agents, num_matches):
                "legal moves available to play.\n").format(total_forfeits))
 
 
+def write_stats(path, test_agents):
+    """Write the search statistics summary of every test agent to a CSV
+    file, or to a JSON file if the path ends with ".json".
+    """
+    summaries = [dict(agent=agent.name, **agent.player.stats.summary())
+                 for agent in test_agents
+                 if getattr(agent.player, "stats", None) is not None]
+    with open(path, "w", newline="") as f:
+        if path.endswith(".json"):
+            json.dump(summaries, f, indent=2)
+        elif summaries:
+            writer = csv.DictWriter(f, fieldnames=list(summaries[0]))
+            writer.writeheader()
+            writer.writerows(summaries)
+
+
 def main():
 
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument(
+        "-p", "--processes", type=int, default=1,
+        help="number of worker processes playing games in parallel (0 for "
+             "one per CPU core); keep it at or below the number of cores so "
+             "that every agent gets a full core for its time limit")
+    parser.add_argument(
+        "--mcts", action="store_true",
+        help="also rate the Monte Carlo tree search agent from "
+             "competition_agent.py under the same time limit")
+    parser.add_argument(
+        "--book", metavar="PATH",
+        help="also rate AB_Improved playing from the opening book in PATH "
+             "(see opening_book.py)")
+    parser.add_argument(
+        "--endgame", action="store_true",
+        help="also rate AB_Improved with the exact solver for partitioned "
+             "endgames from endgame.py")
+    parser.add_argument(
+        "--stats", metavar="PATH",
+        help="collect search statistics of the test agents (nodes/sec, "
+             "depth, cutoff rates, evaluation time) and write a summary per "
+             "agent to PATH as CSV, or as JSON if PATH ends with .json")
+    parser.add_argument(
+        "--positions", metavar="PATH",
+        help="add the positions and results of every game to the position "
+             "dataset in PATH (see heuristic_tuning.py)")
+    parser.add_argument(
+        "--games", metavar="PATH",
+        help="append the record of every game (moves, time per move, "
+             "result) to PATH as JSON lines, gzipped if PATH ends with .gz; "
+             "see isolation.replay() to rebuild positions from them")
+    parser.add_argument(
+        "--weights", metavar="PATH",
+        help="also rate AB_Tuned, using the evaluation function fitted by "
+             "heuristic_tuning.py and saved in PATH")
+    args = parser.parse_args()
+
     # Define two agents to compare -- these agents will play from the same
     # starting position against the same adversaries in the tournament
     test_agents = [
@@ -134,6 +292,21 @@ def main():
         Agent(AlphaBetaPlayer(score_fn=custom_score_2), "AB_Custom_2"),
         Agent(AlphaBetaPlayer(score_fn=custom_score_3), "AB_Custom_3")
     ]
+    if args.mcts:
+        from competition_agent import CustomPlayer
+        test_agents.append(Agent(CustomPlayer(timeout=10.), "MCTS"))
+    if args.book:
+        from opening_book import OpeningBook, OpeningBookPlayer
+        test_agents.append(Agent(OpeningBookPlayer(
+            OpeningBook.load(args.book), score_fn=improved_score), "AB_Book"))
+    if args.endgame:
+        from endgame import EndgamePlayer
+        test_agents.append(Agent(EndgamePlayer(score_fn=improved_score),
+                                 "AB_Endgame"))
+    if args.weights:
+        from heuristic_tuning import LinearScore
+        test_agents.append(Agent(AlphaBetaPlayer(
+            score_fn=LinearScore.load(args.weights)), "AB_Tuned"))
 
     # Define a collection of agents to compete against the test agents
     cpu_agents = [
@@ -146,11 +319,36 @@ def main():
         Agent(AlphaBetaPlayer(score_fn=improved_score), "AB_Improved")
     ]
 
+    if args.stats:
+        for agent in test_agents:
+            if hasattr(agent.player, "search_counters"):
+                agent.player.stats = SearchStats()
+
     print(DESCRIPTION)
     print("{:^74}".format("*************************"))
     print("{:^74}".format("Playing Matches"))
     print("{:^74}".format("*************************"))
-    play_matches(cpu_agents, test_agents, NUM_MATCHES)
+    dataset = None
+    if args.positions:
+        from heuristic_tuning import PositionDataset
+        dataset = PositionDataset()
+    games = GameRecordWriter(args.games) if args.games else None
+    try:
+        if args.processes == 1:
+            play_matches(cpu_agents, test_agents, NUM_MATCHES,
+                         dataset=dataset, games=games)
+        else:
+            with multiprocessing.Pool(args.processes or None) as pool:
+                play_matches(cpu_agents, test_agents, NUM_MATCHES, pool,
+                             dataset, games)
+    finally:
+        if games is not None:
+            games.close()
+
+    if args.stats:
+        write_stats(args.stats, test_agents)
+    if dataset is not None:
+        dataset.save(args.positions, append=True)
 
 
 if __name__ == "__main__":